@@ -1,67 +1,245 @@
 import os
+import json
+import time
+import pickle
+import hashlib
 import pandas as pd
+import matplotlib
+matplotlib.use("Agg")
 import matplotlib.pyplot as plt
-import seaborn as sns
-import networkx as nx
+plt.ioff()
 import pymongo
-from neo4j import GraphDatabase
 import numpy as np
 from matplotlib.patches import FancyBboxPatch
 import matplotlib.patches as mpatches
+from matplotlib.colors import to_rgba
+from matplotlib.collections import LineCollection
 from collections import defaultdict, Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 import warnings
 warnings.filterwarnings('ignore')
 
-# Import analyzer classes
+# Import analyzer classes (seaborn, networkx e neo4j vengono importati nei metodi che li usano)
 from mongodb_analyzer import DNDDataAnalyzer
-from neo4j_analyzer import DNDGraphAnalyzer
+
+# Pesi dei punteggi di classe (modificabili senza rieseguire la query)
+POWER_WEIGHTS = (1.5, 2.0, 1.2)            # damage, high level, unique spells
+SURVIVABILITY_WEIGHTS = (3, 2, 0.5)        # hit die, saving throws, proficiencies
+VERSATILITY_WEIGHTS = (1.0, 1.5)           # non-damage spells, proficiencies
+OVERALL_WEIGHTS = (0.4, 0.3, 0.3)          # power, survivability, versatility
+
+# Categorie di rarità degli spell, indicizzate per limite inferiore del $bucket
+RARITY_BY_BUCKET = {0: 'Uncommon', 1: 'Exclusive', 2: 'Rare', 3: 'Uncommon', 5: 'Common', 'Ubiquitous': 'Ubiquitous'}
+
+# Conversione in monete d'oro e fasce di prezzo dell'equipaggiamento
+GP_PER_UNIT = {'cp': 0.01, 'sp': 0.1, 'gp': 1, 'pp': 10}
+EQUIPMENT_TIER_BINS = [-np.inf, 1, 10, 100, 500, np.inf]
+EQUIPMENT_TIER_LABELS = ['Budget', 'Economy', 'Standard', 'Premium', 'Luxury']
+
+# Indici Neo4j creati all'avvio (no-op se già presenti)
+NEO4J_INDEXES = (
+    "CREATE INDEX class_name IF NOT EXISTS FOR (c:Class) ON (c.name)",
+    "CREATE INDEX spell_name IF NOT EXISTS FOR (s:Spell) ON (s.name)",
+    "CREATE INDEX spell_level IF NOT EXISTS FOR (s:Spell) ON (s.level)",
+    "CREATE INDEX school_name IF NOT EXISTS FOR (sc:School) ON (sc.name)",
+)
+
+# Sotto-pipeline sugli spell, eseguite insieme in un unico $facet
+# Rarità: un solo $bucket sul numero di classi con accesso allo spell
+SPELL_RARITY_PIPELINE = [
+    {"$project": {"n": {"$size": {"$ifNull": ["$classes", []]}}}},
+    {"$bucket": {
+        "groupBy": "$n",
+        "boundaries": [0, 1, 2, 3, 5, 8],
+        "default": "Ubiquitous",
+        "output": {"total_spells": {"$sum": 1}}
+    }}
+]
+
+# Dominanza delle scuole
+SCHOOL_DOMINANCE_PIPELINE = [
+    {"$match": {"school.name": {"$exists": True, "$ne": None}}},
+    {"$group": {
+        "_id": "$school.name",
+        "total_spells": {"$sum": 1},
+        "avg_level": {"$avg": "$level"}
+    }},
+    {"$sort": {"total_spells": -1}}
+]
+
+# Distribuzione degli spell per classe e livello
+SPELL_HEATMAP_PIPELINE = [
+    {"$unwind": "$classes"},
+    {"$group": {
+        "_id": {
+            "class": "$classes.name",
+            "level": "$level"
+        },
+        "spell_count": {"$sum": 1}
+    }},
+    {"$group": {
+        "_id": "$_id.class",
+        "level_distribution": {"$push": {
+            "level": "$_id.level",
+            "count": "$spell_count"
+        }},
+        "total_spells": {"$sum": "$spell_count"}
+    }},
+    {"$sort": {"total_spells": -1}},
+    {"$limit": 8}
+]
 
 class DNDEnhancedVisualizer:
     """
     Visualizzatore D&D che usa le funzioni degli analyzer esistenti
     """
     
+    # Query Cypher parametrizzate: il testo resta costante e Neo4j riusa il piano in cache
+    _centrality_cypher = """
+    MATCH (c:Class)-[:CAN_CAST]->(s:Spell)
+    WITH c, count(s) AS spell_count
+    RETURN c.name AS class_name, spell_count
+    ORDER BY spell_count DESC
+    LIMIT $limit
+    """
+    
+    # Ogni spell è visitato una volta: le coppie di classi nascono dalla lista dei suoi caster
+    _network_cypher = """
+    MATCH (s:Spell)<-[:CAN_CAST]-(c:Class)
+    WITH s, collect(c.name) AS cls
+    UNWIND cls AS c1
+    UNWIND cls AS c2
+    WITH c1, c2
+    WHERE c1 < c2
+    WITH c1, c2, count(*) AS shared_spells
+    WHERE shared_spells > $min_shared
+    RETURN c1 AS class1, c2 AS class2, shared_spells
+    ORDER BY shared_spells DESC
+    LIMIT $limit
+    """
+    
+    # Unica scansione di spell, scuole e classi: sinergie, dominanza, bridge, competizione,
+    # componenti e curve di progressione sono calcolate da qui con pandas/NumPy
+    _spell_scan_cypher = """
+    MATCH (s:Spell)
+    OPTIONAL MATCH (s)-[:BELONGS_TO]->(school:School)
+    WITH s, collect(school.name) AS schools
+    OPTIONAL MATCH (s)<-[:CAN_CAST]-(c:Class)
+    RETURN s.name AS spell_name, s.level AS level, s.components AS components,
+           schools, collect(c.name) AS classes
+    """
+    
     def __init__(self, 
                  mongo_uri="mongodb://localhost:27017/", 
                  mongo_db="HeroNomics",
                  neo4j_uri="bolt://localhost:7687", 
                  neo4j_user="neo4j", 
                  neo4j_password="admin123",
-                 neo4j_database="heronomics"):
+                 neo4j_database="heronomics",
+                 refresh=False):
         
         self.output_dir = "site/dnd_images"
+        self.cache_dir = os.path.join(self.output_dir, ".cache")
         self.ensure_output_dirs()
         
+        # Invalida la cache delle aggregazioni se richiesto
+        if refresh:
+            for filename in os.listdir(self.cache_dir):
+                if filename.endswith(".pkl"):
+                    os.remove(os.path.join(self.cache_dir, filename))
+        
         # Setup databases
         self.setup_databases(mongo_uri, mongo_db, neo4j_uri, neo4j_user, neo4j_password, neo4j_database)
         
         # Inizializza gli analyzer
         self.mongo_analyzer = DNDDataAnalyzer(self.mongo_db) if self.mongo_db is not None else None
-        self.neo4j_analyzer = DNDGraphAnalyzer(neo4j_uri, neo4j_user, neo4j_password, neo4j_database) if self.neo4j_driver is not None else None
+        self.neo4j_analyzer = None
+        if self.neo4j_driver is not None:
+            from neo4j_analyzer import DNDGraphAnalyzer
+            self.neo4j_analyzer = DNDGraphAnalyzer(neo4j_uri, neo4j_user, neo4j_password, neo4j_database, driver=self.neo4j_driver)
         
         # Styling con colori pastello e background bianco
         self.setup_fancy_styling()
+        
+        # Numero totale di spell nel grafo, contato alla prima richiesta
+        self._spell_total = None
+        
+        # Risultati delle query Neo4j dei grafici 8-13, letti in un'unica transazione
+        self._neo_data = None
+        self._spells_df = None
+        
+        # Risultati del $facet sugli spell, condivisi dai grafici 2, 3 e 6
+        self._spells_bundle = None
+        
+        # Layout dei grafi già calcolati, per insieme di nodi/archi e seed (persistiti tra le esecuzioni)
+        self._layout_cache_file = os.path.join(self.cache_dir, "layouts.pkl")
+        self._layout_cache = {}
+        if os.path.exists(self._layout_cache_file):
+            with open(self._layout_cache_file, "rb") as f:
+                self._layout_cache = pickle.load(f)
+        
+        # Figura unica riutilizzata da tutti i grafici (evita di reinizializzare il renderer)
+        self._fig = plt.figure(figsize=(14, 10))
+        self._fig.patch.set_facecolor('white')
 
     def setup_databases(self, mongo_uri, mongo_db, neo4j_uri, neo4j_user, neo4j_password, neo4j_database):
-        """Inizializza connessioni ai database"""
+        """Inizializza connessioni ai database (ogni backend indipendente dall'altro)"""
         try:
             # MongoDB connection
             self.mongo_client = pymongo.MongoClient(mongo_uri)
             self.mongo_db = self.mongo_client[mongo_db]
             print("✓ Connected to MongoDB")
             
-            # Neo4j connection
-            self.neo4j_driver = GraphDatabase.driver(neo4j_uri, auth=(neo4j_user, neo4j_password), database=neo4j_database)
-            print("✓ Connected to Neo4j")
+            # Indici idempotenti sui campi filtrati/raggruppati dalle pipeline dei grafici
+            try:
+                self.mongo_db.spells.create_index([("classes.name", 1), ("level", 1)])
+                self.mongo_db.spells.create_index("school.name")
+                self.mongo_db.equipment.create_index("cost.unit")
+                self.mongo_db.classes.create_index("name")
+                self.mongo_db.races.create_index("name")
+            except Exception as e:
+                print(f"⚠️  MongoDB index creation skipped: {e}")
             
         except Exception as e:
-            print(f"❌ Database connection error: {e}")
+            print(f"❌ MongoDB connection error: {e}")
             self.mongo_client = None
             self.mongo_db = None
+        
+        try:
+            # Neo4j connection
+            from neo4j import GraphDatabase
+            # Un unico pool di connessioni condiviso con il DNDGraphAnalyzer
+            self.neo4j_driver = GraphDatabase.driver(
+                neo4j_uri, auth=(neo4j_user, neo4j_password), database=neo4j_database,
+                max_connection_pool_size=32,
+                connection_acquisition_timeout=30,
+                max_connection_lifetime=3600,
+                keep_alive=True
+            )
+            self.neo4j_database = neo4j_database
+            self.neo4j_session = self.neo4j_driver.session(database=neo4j_database)
+            print("✓ Connected to Neo4j")
+            
+            # Indici idempotenti sulle proprietà usate nei confronti e nei raggruppamenti
+            try:
+                for statement in NEO4J_INDEXES:
+                    self.neo4j_session.run(statement).consume()
+                print(f"✓ Neo4j indexes ready ({len(NEO4J_INDEXES)})")
+            except Exception as e:
+                print(f"⚠️  Neo4j index creation skipped: {e}")
+            
+        except Exception as e:
+            print(f"❌ Neo4j connection error: {e}")
+            if getattr(self, 'neo4j_driver', None) is not None:
+                self.neo4j_driver.close()
             self.neo4j_driver = None
+            self.neo4j_session = None
 
     def setup_fancy_styling(self):
         """Setup styling moderno con sfondo bianco e colori pastello"""
+        import seaborn as sns
+        
         plt.style.use('default')
         sns.set_style("whitegrid")
         
@@ -94,12 +272,68 @@ class DNDEnhancedVisualizer:
             'legend.fontsize': 10,
             'figure.titlesize': 18,
             'font.family': 'sans-serif',
-            'font.sans-serif': ['Arial', 'DejaVu Sans', 'Liberation Sans']
+            'font.sans-serif': ['Arial', 'DejaVu Sans', 'Liberation Sans'],
+            'path.simplify_threshold': 1.0,
+            'agg.path.chunksize': 10000
         })
 
+    def _palette(self, name, n):
+        """Restituisce n colori della palette, ripetendola ciclicamente se necessario"""
+        palette = np.asarray(self.color_palettes[name])
+        return palette[np.arange(n) % len(palette)].tolist()
+
+    def _spring_layout(self, G, seed=42):
+        """Layout spring deterministico, calcolato una sola volta per ogni grafo"""
+        import networkx as nx
+        
+        key = (frozenset(G.nodes()), frozenset(G.edges(data='weight')), seed)
+        if key not in self._layout_cache:
+            # Con una dozzina di nodi 20 iterazioni danno lo stesso layout visivo di 50
+            self._layout_cache[key] = nx.spring_layout(G, seed=seed, k=2, iterations=20)
+            with open(self._layout_cache_file, "wb") as f:
+                pickle.dump(self._layout_cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+        return self._layout_cache[key]
+
+    def _savefig(self, name, left=0.08, right=0.98, top=0.88, bottom=0.12):
+        """Salva la figura condivisa a 150 dpi con compressione PNG rapida.
+        I margini sono fissati con subplots_adjust: senza bbox_inches='tight'
+        la figura viene renderizzata una sola volta."""
+        self._fig.subplots_adjust(left=left, right=right, top=top, bottom=bottom)
+        self._fig.savefig(os.path.join(self.output_dir, name), dpi=150,
+                          facecolor='white', pil_kwargs={'compress_level': 1})
+
+    def _new_axes(self, figsize):
+        """Ripulisce la figura condivisa e restituisce un nuovo asse con la dimensione richiesta"""
+        self._fig.clf()
+        self._fig.set_size_inches(figsize)
+        return self._fig, self._fig.add_subplot(111)
+
     def ensure_output_dirs(self):
         """Crea le directory di output"""
         os.makedirs(self.output_dir, exist_ok=True)
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _cached_aggregate(self, collection, pipeline, ttl=None):
+        """
+        Esegue una pipeline MongoDB usando una cache su disco indicizzata per hash della pipeline
+        e del numero di documenti della collezione (una reimportazione invalida la voce)
+        """
+        doc_count = self.mongo_db[collection].estimated_document_count()
+        pipeline_hash = hashlib.blake2b(
+            json.dumps([pipeline, doc_count], sort_keys=True, default=str).encode()
+        ).hexdigest()
+        cache_file = os.path.join(self.cache_dir, f"{collection}_{pipeline_hash}.pkl")
+        
+        if os.path.exists(cache_file):
+            if ttl is None or time.time() - os.path.getmtime(cache_file) < ttl:
+                with open(cache_file, "rb") as f:
+                    return pickle.load(f)
+        
+        # Il cursore arriva a blocchi di 500 documenti, sovrapponendo rete e deserializzazione
+        result = list(self.mongo_db[collection].aggregate(pipeline, allowDiskUse=True, batchSize=500))
+        with open(cache_file, "wb") as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        return result
 
     # ==========================================
     # WRAPPER METHODS FOR ANALYZER FUNCTIONS
@@ -110,117 +344,203 @@ class DNDEnhancedVisualizer:
         if self.mongo_analyzer is None:
             return []
         
-        # Usa la pipeline esistente dal mongodb_analyzer
+        # Una sola scansione degli spell raggruppata per classe, poi join con la piccola collezione classes
         pipeline = [
-            {"$lookup": {
-                "from": "spells",
-                "localField": "name",
-                "foreignField": "classes.name",
-                "as": "class_spells"
+            {"$project": {
+                "level": 1,
+                "damage": 1,
+                "classes.name": 1,
+                "class_count": {"$size": {"$ifNull": ["$classes", []]}}
             }},
-            {"$addFields": {
-                "total_spells": {"$size": "$class_spells"},
-                "unique_spells": {
-                    "$size": {
-                        "$filter": {
-                            "input": "$class_spells",
-                            "cond": {"$eq": [{"$size": "$$this.classes"}, 1]}
-                        }
-                    }
-                },
-                "high_level_spells": {
-                    "$size": {
-                        "$filter": {
-                            "input": "$class_spells",
-                            "cond": {"$gte": ["$$this.level", 6]}
-                        }
-                    }
-                },
-                "damage_spells": {
-                    "$size": {
-                        "$filter": {
-                            "input": "$class_spells",
-                            "cond": {"$ne": ["$$this.damage", None]}
-                        }
-                    }
-                },
-                "proficiency_count": {"$size": {"$ifNull": ["$proficiencies", []]}},
-                "saving_throw_count": {"$size": {"$ifNull": ["$saving_throws", []]}},
-                "base_survivability": "$hit_die"
+            {"$unwind": "$classes"},
+            {"$group": {
+                "_id": "$classes.name",
+                "total_spells": {"$sum": 1},
+                "unique_spells": {"$sum": {"$cond": [{"$eq": ["$class_count", 1]}, 1, 0]}},
+                "high_level_spells": {"$sum": {"$cond": [{"$gte": ["$level", 6]}, 1, 0]}},
+                "damage_spells": {"$sum": {"$cond": [{"$ne": ["$damage", None]}, 1, 0]}}
             }},
-            {"$addFields": {
-                "power_score": {
-                    "$add": [
-                        {"$multiply": ["$damage_spells", 1.5]},
-                        {"$multiply": ["$high_level_spells", 2.0]},
-                        {"$multiply": ["$unique_spells", 1.2]}
-                    ]
-                },
-                "survivability_score": {
-                    "$add": [
-                        {"$multiply": ["$hit_die", 3]},
-                        {"$multiply": ["$saving_throw_count", 2]},
-                        {"$multiply": ["$proficiency_count", 0.5]}
-                    ]
-                },
-                "versatility_score": {
-                    "$add": [
-                        {"$multiply": [{"$subtract": ["$total_spells", "$damage_spells"]}, 1.0]},
-                        {"$multiply": ["$proficiency_count", 1.5]}
-                    ]
-                }
+            # Le classi senza spell restano nel risultato con conteggi a zero
+            {"$unionWith": {"coll": "classes", "pipeline": [{"$project": {"_id": "$name"}}]}},
+            {"$group": {
+                "_id": "$_id",
+                "total_spells": {"$sum": "$total_spells"},
+                "unique_spells": {"$sum": "$unique_spells"},
+                "high_level_spells": {"$sum": "$high_level_spells"},
+                "damage_spells": {"$sum": "$damage_spells"}
             }},
-            {"$addFields": {
-                "overall_performance": {
-                    "$add": [
-                        {"$multiply": ["$power_score", 0.4]},
-                        {"$multiply": ["$survivability_score", 0.3]},
-                        {"$multiply": ["$versatility_score", 0.3]}
-                    ]
-                }
+            {"$lookup": {
+                "from": "classes",
+                "localField": "_id",
+                "foreignField": "name",
+                "as": "class_doc"
             }},
-            {"$sort": {"overall_performance": -1}}
+            {"$unwind": "$class_doc"},
+            # Un solo stage riscrive il documento: conteggi, campi della classe e rimozione del join
+            {"$project": {
+                "name": "$_id",
+                "total_spells": 1,
+                "unique_spells": 1,
+                "high_level_spells": 1,
+                "damage_spells": 1,
+                "hit_die": "$class_doc.hit_die",
+                "proficiency_count": {"$size": {"$ifNull": ["$class_doc.proficiencies", []]}},
+                "saving_throw_count": {"$size": {"$ifNull": ["$class_doc.saving_throws", []]}},
+                "base_survivability": "$class_doc.hit_die"
+            }}
         ]
         
         try:
-            return list(self.mongo_analyzer.db.classes.aggregate(pipeline))
+            rows = self._cached_aggregate("spells", pipeline)
         except Exception as e:
             print(f"Error getting class power data: {e}")
             return []
+        
+        if not rows:
+            return []
+        
+        # Punteggi calcolati lato client: combinazioni lineari vettorizzate sui conteggi grezzi
+        df = pd.DataFrame(rows).fillna(0)
+        damage, high, unique = POWER_WEIGHTS
+        hit_die, saving, proficiency = SURVIVABILITY_WEIGHTS
+        utility, versatile_proficiency = VERSATILITY_WEIGHTS
+        power_w, survivability_w, versatility_w = OVERALL_WEIGHTS
+        
+        df['power_score'] = (df['damage_spells'] * damage
+                             + df['high_level_spells'] * high
+                             + df['unique_spells'] * unique)
+        df['survivability_score'] = (df['hit_die'] * hit_die
+                                     + df['saving_throw_count'] * saving
+                                     + df['proficiency_count'] * proficiency)
+        df['versatility_score'] = ((df['total_spells'] - df['damage_spells']) * utility
+                                   + df['proficiency_count'] * versatile_proficiency)
+        df['overall_performance'] = (df['power_score'] * power_w
+                                     + df['survivability_score'] * survivability_w
+                                     + df['versatility_score'] * versatility_w)
+        
+        return df.sort_values('overall_performance', ascending=False).to_dict('records')
+
+    def get_spells_bundle(self):
+        """Esegue rarità, scuole e heatmap in un'unica scansione della collezione spells"""
+        if self._spells_bundle is None:
+            self._spells_bundle = self._cached_aggregate("spells", [{"$facet": {
+                "rarity": SPELL_RARITY_PIPELINE,
+                "schools": SCHOOL_DOMINANCE_PIPELINE,
+                "heatmap": SPELL_HEATMAP_PIPELINE
+            }}])[0]
+        return self._spells_bundle
 
     def get_spell_class_network_data(self):
         """Ottiene dati di rete dal Neo4j analyzer"""
         if self.neo4j_analyzer is None:
             return [], []
         
-        with self.neo4j_analyzer.driver.session() as session:
-            # Query per centralità (dal neo4j_analyzer)
-            centrality_query = """
-            MATCH (c:Class)-[:CAN_CAST]->(s:Spell)
-            WITH c, count(s) as spell_count
-            ORDER BY spell_count DESC
-            RETURN c.name as class_name, spell_count,
-                   round(spell_count * 1.0 / 319 * 100, 2) as network_influence
-            LIMIT 12
-            """
-            
-            centrality_data = session.run(centrality_query).data()
-            
-            # Query per network (dal neo4j_analyzer)  
-            network_query = """
-            MATCH (c1:Class)-[:CAN_CAST]->(s:Spell)<-[:CAN_CAST]-(c2:Class)
-            WHERE c1.name < c2.name
-            WITH c1, c2, count(s) as shared_spells
-            WHERE shared_spells > 10
-            RETURN c1.name as class1, c2.name as class2, shared_spells
-            ORDER BY shared_spells DESC
-            LIMIT 20
-            """
-            
-            network_data = session.run(network_query).data()
+        # Query per centralità e per network (dal neo4j_analyzer), indipendenti: eseguite in parallelo
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            centrality_future = executor.submit(self._run_cypher, self._centrality_cypher, limit=12)
+            network_future = executor.submit(self._run_cypher, self._network_cypher, min_shared=10, limit=20)
             
+            centrality_data, network_data = centrality_future.result(), network_future.result()
+        
+        # Influenza di rete calcolata lato client sui conteggi grezzi
+        counts = np.fromiter((row['spell_count'] for row in centrality_data), dtype=np.float64,
+                             count=len(centrality_data))
+        influence = np.round(counts * 100.0 / self.get_spell_total(), 2)
+        for row, value in zip(centrality_data, influence.tolist()):
+            row['network_influence'] = value
+        
         return centrality_data, network_data
 
+    def get_spell_total(self):
+        """Conta gli spell nel grafo una sola volta e riusa il valore nelle percentuali"""
+        if self._spell_total is None:
+            self._spell_total = self.neo4j_session.run("MATCH (s:Spell) RETURN count(s) AS n").single()['n']
+        return self._spell_total
+
+    def get_neo4j_data(self):
+        """Esegue tutte le query dei grafici Neo4j in un'unica transazione di lettura e ne memorizza i risultati"""
+        if self._neo_data is None:
+            with self.shared_session() as session:
+                rows = session.execute_read(lambda tx: tx.run(self._spell_scan_cypher).data())
+            
+            self._spells_df = pd.DataFrame(rows, columns=["spell_name", "level", "components", "schools", "classes"])
+            self._neo_data = self._graph_metrics_from_spells(self._spells_df)
+        return self._neo_data
+
+    def _graph_metrics_from_spells(self, spells_df):
+        """Ricava dalla scansione degli spell i dati dei grafici 8-13"""
+        spells = spells_df.reset_index().rename(columns={'index': 'sid'})
+        casts = spells[['sid', 'classes']].explode('classes').dropna().rename(columns={'classes': 'class_name'})
+        belongs = spells[['sid', 'level', 'schools']].explode('schools').dropna(subset=['schools'])
+        belongs = belongs.rename(columns={'schools': 'school_name'})
+        
+        # 8. Sinergie: coppie di classi che condividono spell
+        pairs = casts.merge(casts, on='sid')
+        pairs = pairs[pairs['class_name_x'] < pairs['class_name_y']]
+        synergy = pairs.groupby(['class_name_x', 'class_name_y']).size().rename('shared_spells').reset_index()
+        synergy = synergy[synergy['shared_spells'] > 15].sort_values('shared_spells', ascending=False)
+        synergy = synergy.rename(columns={'class_name_x': 'class1', 'class_name_y': 'class2'})
+        synergy['synergy_score'] = (synergy['shared_spells'] * 100.0 / len(spells)).round(2)
+        
+        # 9. Dominanza: raggio d'azione delle scuole sulle classi
+        school_casts = belongs.merge(casts, on='sid')
+        dominance = school_casts.groupby('school_name').agg(
+            spell_count=('sid', 'size'), class_reach=('class_name', 'nunique')).reset_index()
+        dominance = dominance.sort_values(['class_reach', 'spell_count'], ascending=False)
+        dominance['market_penetration'] = (dominance['class_reach'] * 100.0 / 12).round(1)
+        
+        # 10. Bridge: numero di coppie distinte di classi collegate da ogni spell
+        class_counts = casts.groupby('sid')['class_name'].nunique()
+        bridge = spells.set_index('sid').loc[class_counts.index, ['spell_name', 'level']].copy()
+        bridge['bridge_count'] = class_counts * (class_counts - 1) // 2
+        bridge = bridge[bridge['bridge_count'] > 0].sort_values('bridge_count', ascending=False).head(15)
+        
+        # 11. Competizione: classi che usano entrambe le scuole
+        class_schools = school_casts[['class_name', 'school_name']].drop_duplicates()
+        school_pairs = class_schools.merge(class_schools, on='class_name')
+        school_pairs = school_pairs[school_pairs['school_name_x'] < school_pairs['school_name_y']]
+        competition = school_pairs.groupby(['school_name_x', 'school_name_y']).size().rename('shared_classes').reset_index()
+        competition = competition[competition['shared_classes'] > 2].sort_values('shared_classes', ascending=False)
+        competition = competition.rename(columns={'school_name_x': 'school1', 'school_name_y': 'school2'})
+        
+        # 12. Componenti: percentuale di spell V/S/M per livello con np.bincount
+        leveled = spells.dropna(subset=['level'])
+        leveled = leveled[(leveled['level'] >= 0) & (leveled['level'] <= 9)]
+        levels = leveled['level'].to_numpy(dtype=np.int64)
+        totals = np.bincount(levels, minlength=10)
+        present = np.flatnonzero(totals)
+        component = pd.DataFrame({'spell_level': present})
+        for column, letter in (('verbal_pct', 'V'), ('somatic_pct', 'S'), ('material_pct', 'M')):
+            mask = np.fromiter((letter in (comps or []) for comps in leveled['components']),
+                               dtype=np.float64, count=len(leveled))
+            needs = np.bincount(levels, weights=mask, minlength=10)
+            component[column] = np.round(needs[present] * 100.0 / totals[present], 1)
+        
+        # 13. Progressione: distribuzione per livello degli spell di ogni scuola
+        level_counts = belongs.groupby(['school_name', 'level']).size().rename('count').reset_index()
+        progression = [
+            {'school_name': school, 'distribution': group[['level', 'count']].to_dict('records')}
+            for school, group in level_counts.groupby('school_name')
+        ]
+        
+        return {
+            "synergy": synergy.to_dict('records'),
+            "dominance": dominance.to_dict('records'),
+            "bridge": bridge.to_dict('records'),
+            "competition": competition.to_dict('records'),
+            "component": component.to_dict('records'),
+            "progression": progression
+        }
+
+    def shared_session(self):
+        """Sessione Neo4j condivisa da tutti i grafici del batch (non viene chiusa all'uscita dal with)"""
+        return nullcontext(self.neo4j_session)
+
+    def _run_cypher(self, query, **params):
+        """Esegue una query in una sessione dedicata (le sessioni Neo4j non sono thread-safe)"""
+        with self.neo4j_driver.session(database=self.neo4j_database) as session:
+            return session.run(query, **params).data()
+
     # ==========================================
     # MONGODB ANALYZER VISUALIZATIONS (6)
     # ==========================================
@@ -235,8 +555,7 @@ class DNDEnhancedVisualizer:
             return
         
         # Create visualization - Bubble Chart
-        fig, ax = plt.subplots(figsize=(14, 10))
-        fig.patch.set_facecolor('white')
+        fig, ax = self._new_axes(figsize=(14, 10))
         
         classes = [item['name'] for item in data[:10]]
         power_scores = [item['power_score'] for item in data[:10]]
@@ -244,9 +563,7 @@ class DNDEnhancedVisualizer:
         versatility_scores = [item['versatility_score'] for item in data[:10]]
         
         # Fix color array length to match data points
-        colors = self.color_palettes['gradient_pastels'][:len(classes)]
-        if len(colors) < len(classes):
-            colors = (colors * ((len(classes) // len(colors)) + 1))[:len(classes)]
+        colors = self._palette('gradient_pastels', len(classes))
         
         scatter = ax.scatter(power_scores, survival_scores, 
                            s=[v*8 for v in versatility_scores],
@@ -266,11 +583,7 @@ class DNDEnhancedVisualizer:
                     fontsize=16, fontweight='bold', pad=20, color='#2C3E50')
         ax.grid(alpha=0.3, color='#DDDDDD')
         ax.set_facecolor('white')
-        
-        plt.tight_layout()
-        plt.savefig(os.path.join(self.output_dir, "1_class_power_metrics.png"), 
-                   dpi=300, bbox_inches='tight', facecolor='white')
-        plt.close()
+        self._savefig("1_class_power_metrics.png")
 
     def plot_2_spell_rarity_distribution(self):
         """2. Spell Rarity Distribution"""
@@ -280,45 +593,22 @@ class DNDEnhancedVisualizer:
             print("No MongoDB analyzer available")
             return
         
-        # Simula l'analisi di rarità
-        pipeline = [
-            {"$addFields": {
-                "class_access_count": {"$size": {"$ifNull": ["$classes", []]}},
-                "spell_level": "$level"
-            }},
-            {"$addFields": {
-                "rarity_category": {
-                    "$switch": {
-                        "branches": [
-                            {"case": {"$eq": ["$class_access_count", 1]}, "then": "Exclusive"},
-                            {"case": {"$eq": ["$class_access_count", 2]}, "then": "Rare"},
-                            {"case": {"$lte": ["$class_access_count", 4]}, "then": "Uncommon"},
-                            {"case": {"$lte": ["$class_access_count", 7]}, "then": "Common"}
-                        ],
-                        "default": "Ubiquitous"
-                    }
-                }
-            }},
-            {"$group": {
-                "_id": "$rarity_category",
-                "total_spells": {"$sum": 1}
-            }},
-            {"$sort": {"total_spells": -1}}
-        ]
-        
         try:
-            data = list(self.mongo_analyzer.db.spells.aggregate(pipeline))
+            data = self.get_spells_bundle()["rarity"]
             if not data:
                 print("No spell rarity data available")
                 return
             
-            fig, ax = plt.subplots(figsize=(12, 8))
-            fig.patch.set_facecolor('white')
+            # Limite inferiore del bucket -> categoria (gli spell senza classi restano "Uncommon")
+            rarity_totals = Counter()
+            for item in data:
+                rarity_totals[RARITY_BY_BUCKET[item['_id']]] += item['total_spells']
+            
+            fig, ax = self._new_axes(figsize=(12, 8))
             
-            rarity_names = [item['_id'] for item in data]
-            rarity_counts = [item['total_spells'] for item in data]
+            rarity_names, rarity_counts = zip(*rarity_totals.most_common())
             
-            colors = self.color_palettes['soft_blues'][:len(rarity_names)]
+            colors = self._palette('soft_blues', len(rarity_names))
             
             wedges, texts, autotexts = ax.pie(rarity_counts, labels=rarity_names, 
                                             colors=colors, autopct='%1.1f%%',
@@ -331,11 +621,7 @@ class DNDEnhancedVisualizer:
             
             ax.set_title('Spell Rarity Distribution\nMarket Share Analysis', 
                         fontsize=16, fontweight='bold', pad=20, color='#2C3E50')
-            
-            plt.tight_layout()
-            plt.savefig(os.path.join(self.output_dir, "2_spell_rarity_distribution.png"), 
-                       dpi=300, bbox_inches='tight', facecolor='white')
-            plt.close()
+            self._savefig("2_spell_rarity_distribution.png")
             
         except Exception as e:
             print(f"Error in spell rarity analysis: {e}")
@@ -348,31 +634,19 @@ class DNDEnhancedVisualizer:
             print("No MongoDB analyzer available")
             return
         
-        # Simula l'analisi di dominanza delle scuole
-        pipeline = [
-            {"$match": {"school.name": {"$exists": True, "$ne": None}}},
-            {"$group": {
-                "_id": "$school.name",
-                "total_spells": {"$sum": 1},
-                "avg_level": {"$avg": "$level"}
-            }},
-            {"$sort": {"total_spells": -1}}
-        ]
-        
         try:
-            data = list(self.mongo_analyzer.db.spells.aggregate(pipeline))
+            data = self.get_spells_bundle()["schools"]
             if not data:
                 print("No school market data available")
                 return
             
-            fig, ax = plt.subplots(figsize=(14, 8))
-            fig.patch.set_facecolor('white')
+            fig, ax = self._new_axes(figsize=(14, 8))
             
             schools = [item['_id'] for item in data]
             spell_counts = [item['total_spells'] for item in data]
             avg_levels = [item['avg_level'] for item in data]
             
-            colors = self.color_palettes['soft_greens'][:len(schools)]
+            colors = self._palette('soft_greens', len(schools))
             
             bars = ax.bar(schools, spell_counts, color=colors, alpha=0.8, 
                          edgecolor='white', linewidth=2)
@@ -389,11 +663,7 @@ class DNDEnhancedVisualizer:
             ax.tick_params(axis='x', rotation=45)
             ax.grid(axis='y', alpha=0.3, color='#DDDDDD')
             ax.set_facecolor('white')
-            
-            plt.tight_layout()
-            plt.savefig(os.path.join(self.output_dir, "3_school_market_dominance.png"), 
-                       dpi=300, bbox_inches='tight', facecolor='white')
-            plt.close()
+            self._savefig("3_school_market_dominance.png", bottom=0.22)
             
         except Exception as e:
             print(f"Error in school market analysis: {e}")
@@ -406,56 +676,29 @@ class DNDEnhancedVisualizer:
             print("No MongoDB analyzer available")
             return
         
-        # Simula l'analisi dei tier di equipaggiamento
+        # Simula l'analisi dei tier di equipaggiamento: proiezione minima, binning lato client
         pipeline = [
             {"$match": {"cost.quantity": {"$exists": True, "$ne": None}}},
-            {"$addFields": {
-                "cost_in_gp": {
-                    "$switch": {
-                        "branches": [
-                            {"case": {"$eq": ["$cost.unit", "cp"]}, "then": {"$divide": ["$cost.quantity", 100]}},
-                            {"case": {"$eq": ["$cost.unit", "sp"]}, "then": {"$divide": ["$cost.quantity", 10]}},
-                            {"case": {"$eq": ["$cost.unit", "gp"]}, "then": "$cost.quantity"},
-                            {"case": {"$eq": ["$cost.unit", "pp"]}, "then": {"$multiply": ["$cost.quantity", 10]}}
-                        ],
-                        "default": 0
-                    }
-                }
-            }},
-            {"$addFields": {
-                "price_tier": {
-                    "$switch": {
-                        "branches": [
-                            {"case": {"$lt": ["$cost_in_gp", 1]}, "then": "Budget"},
-                            {"case": {"$lt": ["$cost_in_gp", 10]}, "then": "Economy"},
-                            {"case": {"$lt": ["$cost_in_gp", 100]}, "then": "Standard"},
-                            {"case": {"$lt": ["$cost_in_gp", 500]}, "then": "Premium"}
-                        ],
-                        "default": "Luxury"
-                    }
-                }
-            }},
-            {"$group": {
-                "_id": "$price_tier",
-                "item_count": {"$sum": 1},
-                "avg_cost": {"$avg": "$cost_in_gp"}
-            }},
-            {"$sort": {"avg_cost": 1}}
+            {"$project": {"_id": 0, "unit": "$cost.unit", "q": "$cost.quantity"}}
         ]
         
         try:
-            data = list(self.mongo_analyzer.db.equipment.aggregate(pipeline))
+            data = self._cached_aggregate("equipment", pipeline)
             if not data:
                 print("No equipment tier data available")
                 return
             
-            fig, ax = plt.subplots(figsize=(12, 8))
-            fig.patch.set_facecolor('white')
+            df = pd.DataFrame(data)
+            df['gp'] = df['q'] * df['unit'].map(GP_PER_UNIT).fillna(0)
+            df['tier'] = pd.cut(df['gp'], EQUIPMENT_TIER_BINS, labels=EQUIPMENT_TIER_LABELS, right=False)
+            tier_counts = df.groupby('tier', observed=True).size()
+            
+            fig, ax = self._new_axes(figsize=(12, 8))
             
-            tiers = [item['_id'] for item in data]
-            counts = [item['item_count'] for item in data]
+            tiers = tier_counts.index.tolist()
+            counts = tier_counts.tolist()
             
-            colors = self.color_palettes['soft_pinks'][:len(tiers)]
+            colors = self._palette('soft_pinks', len(tiers))
             
             bars = ax.bar(tiers, counts, color=colors, alpha=0.8, 
                          edgecolor='white', linewidth=2)
@@ -471,11 +714,7 @@ class DNDEnhancedVisualizer:
                         fontsize=16, fontweight='bold', pad=20, color='#2C3E50')
             ax.grid(axis='y', alpha=0.3, color='#DDDDDD')
             ax.set_facecolor('white')
-            
-            plt.tight_layout()
-            plt.savefig(os.path.join(self.output_dir, "4_equipment_tiers.png"), 
-                       dpi=300, bbox_inches='tight', facecolor='white')
-            plt.close()
+            self._savefig("4_equipment_tiers.png")
             
         except Exception as e:
             print(f"Error in equipment tier analysis: {e}")
@@ -488,41 +727,38 @@ class DNDEnhancedVisualizer:
             print("No MongoDB analyzer available")
             return
         
-        # Simula l'analisi dei vantaggi razziali
+        # Simula l'analisi dei vantaggi razziali: conteggi lato server, punteggio e top 15 lato client
         pipeline = [
-            {"$addFields": {
-                "ability_bonus_count": {"$size": {"$ifNull": ["$ability_bonuses", []]}},
-                "trait_count": {"$size": {"$ifNull": ["$traits", []]}},
-                "language_count": {"$size": {"$ifNull": ["$languages", []]}},
-                "speed": {"$ifNull": ["$speed", 30]}
-            }},
-            {"$addFields": {
-                "advantage_score": {
-                    "$add": [
-                        {"$multiply": ["$ability_bonus_count", 2]},
-                        {"$multiply": ["$trait_count", 1.5]},
-                        {"$multiply": ["$language_count", 0.5]},
-                        {"$divide": ["$speed", 10]}
-                    ]
-                }
-            }},
-            {"$sort": {"advantage_score": -1}},
-            {"$limit": 15}
+            {"$project": {
+                "_id": 0,
+                "name": 1,
+                "ab": {"$size": {"$ifNull": ["$ability_bonuses", []]}},
+                "tr": {"$size": {"$ifNull": ["$traits", []]}},
+                "lg": {"$size": {"$ifNull": ["$languages", []]}},
+                "sp": {"$ifNull": ["$speed", 30]}
+            }}
         ]
         
         try:
-            data = list(self.mongo_analyzer.db.races.aggregate(pipeline))
+            data = self._cached_aggregate("races", pipeline)
             if not data:
                 print("No racial advantage data available")
                 return
             
-            fig, ax = plt.subplots(figsize=(12, 8))
-            fig.patch.set_facecolor('white')
+            arr = np.rec.fromrecords([(r['name'], r['ab'], r['tr'], r['lg'], r['sp']) for r in data],
+                                     names='name,ab,tr,lg,sp')
+            score = 2 * arr.ab + 1.5 * arr.tr + 0.5 * arr.lg + arr.sp / 10
+            
+            # Selezione O(n) dei migliori 15, poi ordinamento solo di quelli
+            top = np.argpartition(-score, min(15, len(score) - 1))[:15]
+            top = top[np.argsort(-score[top])]
+            
+            fig, ax = self._new_axes(figsize=(12, 8))
             
-            races = [item['name'] for item in data]
-            scores = [item['advantage_score'] for item in data]
+            races = arr.name[top].tolist()
+            scores = score[top].tolist()
             
-            colors = self.color_palettes['gradient_pastels'][:len(races)]
+            colors = self._palette('gradient_pastels', len(races))
             
             bars = ax.barh(races, scores, color=colors, alpha=0.8, 
                           edgecolor='white', linewidth=2)
@@ -538,11 +774,7 @@ class DNDEnhancedVisualizer:
                         fontsize=16, fontweight='bold', pad=20, color='#2C3E50')
             ax.grid(axis='x', alpha=0.3, color='#DDDDDD')
             ax.set_facecolor('white')
-            
-            plt.tight_layout()
-            plt.savefig(os.path.join(self.output_dir, "5_racial_advantages.png"), 
-                       dpi=300, bbox_inches='tight', facecolor='white')
-            plt.close()
+            self._savefig("5_racial_advantages.png", left=0.15)
             
         except Exception as e:
             print(f"Error in racial advantage analysis: {e}")
@@ -555,30 +787,8 @@ class DNDEnhancedVisualizer:
             print("No MongoDB analyzer available")
             return
         
-        # Simula l'analisi di distribuzione degli spell
-        pipeline = [
-            {"$unwind": "$classes"},
-            {"$group": {
-                "_id": {
-                    "class": "$classes.name",
-                    "level": "$level"
-                },
-                "spell_count": {"$sum": 1}
-            }},
-            {"$group": {
-                "_id": "$_id.class",
-                "level_distribution": {"$push": {
-                    "level": "$_id.level",
-                    "count": "$spell_count"
-                }},
-                "total_spells": {"$sum": "$spell_count"}
-            }},
-            {"$sort": {"total_spells": -1}},
-            {"$limit": 8}
-        ]
-        
         try:
-            data = list(self.mongo_analyzer.db.spells.aggregate(pipeline))
+            data = self.get_spells_bundle()["heatmap"]
             if not data:
                 print("No spell distribution data available")
                 return
@@ -587,26 +797,25 @@ class DNDEnhancedVisualizer:
             classes = [item['_id'] for item in data]
             max_level = 9
             
-            matrix_data = []
-            for class_data in data:
-                row = [0] * (max_level + 1)  # Levels 0-9
-                for level_info in class_data['level_distribution']:
-                    level = level_info['level']
-                    if 0 <= level <= max_level:
-                        row[level] = level_info['count']
-                matrix_data.append(row)
+            # Indici riga/colonna piatti e riempimento vettoriale della matrice (Levels 0-9)
+            rows = np.repeat(np.arange(len(data)), [len(d['level_distribution']) for d in data])
+            cols = np.fromiter((lv['level'] for d in data for lv in d['level_distribution']), dtype=np.int32)
+            vals = np.fromiter((lv['count'] for d in data for lv in d['level_distribution']), dtype=np.int32)
             
-            matrix = np.array(matrix_data)
+            matrix = np.zeros((len(data), max_level + 1), dtype=np.int32)
+            mask = (cols >= 0) & (cols <= max_level)
+            np.add.at(matrix, (rows[mask], cols[mask]), vals[mask])
             
-            fig, ax = plt.subplots(figsize=(14, 8))
-            fig.patch.set_facecolor('white')
+            fig, ax = self._new_axes(figsize=(14, 8))
             
             # Custom pastel colormap
             colors = ['#FFFFFF', '#FFE5E5', '#FFCCCC', '#FFB3B3', '#FF9999', '#FF8080']
             from matplotlib.colors import LinearSegmentedColormap
             cmap = LinearSegmentedColormap.from_list('pastel_heat', colors, N=256)
             
-            im = ax.imshow(matrix, cmap=cmap, aspect='auto', interpolation='bilinear')
+            # Celle discrete: niente ricampionamento, e uint8 quando i conteggi lo permettono
+            matrix_u8 = matrix.astype(np.uint8) if matrix.max() < 256 else matrix
+            im = ax.imshow(matrix_u8, cmap=cmap, aspect='auto', interpolation='nearest')
             
             # Set ticks and labels
             ax.set_xticks(range(max_level + 1))
@@ -615,14 +824,13 @@ class DNDEnhancedVisualizer:
             ax.set_yticks(range(len(classes)))
             ax.set_yticklabels(classes, fontsize=11, color='#444444')
             
-            # Add text annotations
-            for i in range(len(classes)):
-                for j in range(max_level + 1):
-                    value = matrix[i, j]
-                    if value > 0:
-                        text_color = '#333333' if value < matrix.max() * 0.6 else '#FFFFFF'
-                        ax.text(j, i, str(int(value)), ha='center', va='center',
-                               color=text_color, fontweight='bold', fontsize=9)
+            # Add text annotations: solo celle non nulle, colore del testo deciso in blocco
+            ys, xs = np.nonzero(matrix)
+            vals = matrix[ys, xs]
+            text_colors = np.where(vals < matrix.max() * 0.6, '#333333', '#FFFFFF')
+            for y, x, value, text_color in zip(ys, xs, vals, text_colors):
+                ax.text(x, y, str(value), ha='center', va='center',
+                       color=text_color, fontweight='bold', fontsize=9)
             
             ax.set_xlabel('Spell Level', fontsize=12, fontweight='bold', color='#444444')
             ax.set_ylabel('Classes', fontsize=12, fontweight='bold', color='#444444')
@@ -630,13 +838,9 @@ class DNDEnhancedVisualizer:
                         fontsize=16, fontweight='bold', pad=20, color='#2C3E50')
             
             # Add colorbar
-            cbar = plt.colorbar(im, ax=ax, fraction=0.046, pad=0.1)
+            cbar = fig.colorbar(im, ax=ax, fraction=0.046, pad=0.1)
             cbar.set_label('Number of Spells', rotation=270, labelpad=15, fontsize=12, color='#444444')
-            
-            plt.tight_layout()
-            plt.savefig(os.path.join(self.output_dir, "6_spell_distribution_heatmap.png"), 
-                       dpi=300, bbox_inches='tight', facecolor='white')
-            plt.close()
+            self._savefig("6_spell_distribution_heatmap.png")
             
         except Exception as e:
             print(f"Error in spell distribution analysis: {e}")
@@ -659,6 +863,8 @@ class DNDEnhancedVisualizer:
 
     def _create_static_network_plot(self, centrality_data, network_data, filename):
         """Crea una versione statica del network plot"""
+        import networkx as nx
+        
         G = nx.Graph()
         
         # Add nodes
@@ -675,21 +881,20 @@ class DNDEnhancedVisualizer:
             if G.has_node(class1) and G.has_node(class2):
                 G.add_edge(class1, class2, weight=shared)
         
-        fig, ax = plt.subplots(figsize=(14, 10))
-        fig.patch.set_facecolor('white')
+        fig, ax = self._new_axes(figsize=(14, 10))
         
-        pos = nx.spring_layout(G, seed=42, k=2, iterations=50)
+        pos = self._spring_layout(G)
         
-        # Draw edges
-        edges = G.edges(data=True)
-        for (u, v, d) in edges:
-            weight = d['weight']
-            width = max(1, weight / 10)
-            alpha = min(0.9, 0.3 + (weight / 50) * 0.5)  # Ensure alpha is <= 1
-            nx.draw_networkx_edges(G, pos, [(u, v)], width=width, alpha=alpha, edge_color='#CCCCCC')
+        # Draw edges: larghezze e trasparenze calcolate in blocco, un solo draw per tutti gli archi
+        weights = np.fromiter((d['weight'] for _, _, d in G.edges(data=True)), dtype=np.float64)
+        widths = np.maximum(1.0, weights / 10)
+        alphas = np.minimum(0.9, 0.3 + (weights / 50) * 0.5)  # Ensure alpha is <= 1
+        edge_colors = np.tile(to_rgba('#CCCCCC'), (len(weights), 1))
+        edge_colors[:, 3] = alphas
+        nx.draw_networkx_edges(G, pos, edgelist=list(G.edges()), width=widths, edge_color=edge_colors)
         
         # Draw nodes
-        node_colors = self.color_palettes['network'][:len(G.nodes())]
+        node_colors = self._palette('network', len(G.nodes()))
         node_sizes = [G.nodes[node]['influence'] * 50 for node in G.nodes()]
         
         nx.draw_networkx_nodes(G, pos, node_color=node_colors, node_size=node_sizes,
@@ -701,12 +906,8 @@ class DNDEnhancedVisualizer:
         ax.set_title('D&D Class Spell Network\nNode size = Network Influence', 
                     fontsize=16, fontweight='bold', pad=20, color='#2C3E50')
         ax.set_facecolor('white')
-        plt.axis('off')
-        
-        plt.tight_layout()
-        plt.savefig(os.path.join(self.output_dir, filename), 
-                   dpi=300, bbox_inches='tight', facecolor='white')
-        plt.close()
+        ax.axis('off')
+        self._savefig(filename)
 
     def plot_8_multiclass_synergy_network(self):
         """8. Multiclass Synergy Network - solo PNG statico"""
@@ -716,19 +917,7 @@ class DNDEnhancedVisualizer:
             print("No Neo4j analyzer available")
             return
         
-        with self.neo4j_analyzer.driver.session() as session:
-            # Query dal neo4j_analyzer per synergy matrix
-            synergy_query = """
-            MATCH (c1:Class)-[:CAN_CAST]->(s:Spell)<-[:CAN_CAST]-(c2:Class)
-            WHERE c1.name < c2.name
-            WITH c1, c2, count(s) as shared_spells
-            WHERE shared_spells > 15
-            RETURN c1.name as class1, c2.name as class2, shared_spells,
-                   round(shared_spells * 1.0 / 319 * 100, 2) as synergy_score
-            ORDER BY shared_spells DESC
-            """
-            
-            data = session.run(synergy_query).data()
+        data = self.get_neo4j_data()["synergy"]
         
         if not data:
             print("No synergy data available")
@@ -739,6 +928,8 @@ class DNDEnhancedVisualizer:
 
     def _create_static_synergy_plot(self, data, filename):
         """Crea versione statica del synergy network"""
+        import networkx as nx
+        
         G = nx.Graph()
         
         for item in data:
@@ -746,42 +937,33 @@ class DNDEnhancedVisualizer:
                       weight=item['synergy_score'],
                       shared_spells=item['shared_spells'])
         
-        fig, ax = plt.subplots(figsize=(16, 12))
-        fig.patch.set_facecolor('white')
+        fig, ax = self._new_axes(figsize=(16, 12))
         
-        pos = nx.spring_layout(G, seed=42, k=2, iterations=50)
+        pos = self._spring_layout(G)
         
-        # Draw edges with varying thickness
-        edges = G.edges(data=True)
-        for (u, v, d) in edges:
-            weight = d['weight']
-            width = (weight / 10) + 1
-            alpha = min(0.9, 0.3 + (weight / 100) * 0.5)
-            color = plt.cm.Pastel1(weight / 100)
-            
-            nx.draw_networkx_edges(G, pos, [(u, v)], width=width,
-                                  edge_color=[color], alpha=alpha)
+        # Draw edges with varying thickness: un'unica LineCollection per tutti gli archi
+        segments = np.array([[pos[u], pos[v]] for u, v in G.edges()])
+        weights = np.array([d['weight'] for _, _, d in G.edges(data=True)])
+        widths = weights / 10 + 1
+        colors = plt.cm.Pastel1(weights / 100)
+        colors[:, 3] = np.minimum(0.9, 0.3 + (weights / 100) * 0.5)
+        ax.add_collection(LineCollection(segments, linewidths=widths, colors=colors, zorder=1))
+        ax.autoscale_view()
         
         # Draw nodes
-        node_colors = self.color_palettes['network'][:len(G.nodes())]
+        node_colors = self._palette('network', len(G.nodes()))
         nx.draw_networkx_nodes(G, pos, node_color=node_colors, node_size=3000,
                               alpha=0.9, edgecolors='white', linewidths=3)
         
         # Draw labels
-        for node, (x, y) in pos.items():
-            ax.text(x, y, node, fontsize=11, fontweight='bold', color='#333333',
-                   ha='center', va='center',
-                   bbox=dict(boxstyle='round,pad=0.3', facecolor='white', alpha=0.9))
+        nx.draw_networkx_labels(G, pos, font_size=11, font_weight='bold', font_color='#333333',
+                               bbox=dict(boxstyle='round,pad=0.3', facecolor='white', alpha=0.9), ax=ax)
         
         ax.set_title('Multiclass Synergy Network\nEdge thickness = Synergy strength', 
                     fontsize=18, fontweight='bold', pad=30, color='#2C3E50')
         ax.set_facecolor('white')
-        plt.axis('off')
-        
-        plt.tight_layout()
-        plt.savefig(os.path.join(self.output_dir, filename), 
-                   dpi=300, bbox_inches='tight', facecolor='white')
-        plt.close()
+        ax.axis('off')
+        self._savefig(filename)
 
     def plot_9_school_dominance_ecosystem(self):
         """9. School Dominance Ecosystem"""
@@ -791,42 +973,27 @@ class DNDEnhancedVisualizer:
             print("No Neo4j analyzer available")
             return
         
-        with self.neo4j_analyzer.driver.session() as session:
-            # Query dal neo4j_analyzer per school dominance
-            dominance_query = """
-            MATCH (s:Spell)-[:BELONGS_TO]->(school:School)
-            MATCH (s)<-[:CAN_CAST]-(c:Class)
-            WITH school, count(DISTINCT c) as class_reach, 
-                 count(s) as spell_count
-            ORDER BY class_reach DESC, spell_count DESC
-            RETURN school.name as school_name, spell_count, class_reach,
-                   round(class_reach * 1.0 / 12 * 100, 1) as market_penetration
-            """
-            
-            data = session.run(dominance_query).data()
+        data = self.get_neo4j_data()["dominance"]
         
         if not data:
             print("No school dominance data available")
             return
         
-        fig, ax = plt.subplots(figsize=(14, 8))
-        fig.patch.set_facecolor('white')
+        fig, ax = self._new_axes(figsize=(14, 8))
         
         schools = [item['school_name'] for item in data]
         penetration = [item['market_penetration'] for item in data]
         spell_counts = [item['spell_count'] for item in data]
         
         # Fix color array length to match data points
-        colors = self.color_palettes['soft_greens'][:len(schools)]
-        if len(colors) < len(schools):
-            colors = (colors * ((len(schools) // len(colors)) + 1))[:len(schools)]
+        colors = self._palette('soft_greens', len(schools))
         
-        scatter = ax.scatter(penetration, spell_counts, 
-                           s=[s*3 for s in spell_counts],
+        sizes = np.asarray(spell_counts, dtype=np.float32) * 3
+        scatter = ax.scatter(penetration, spell_counts, s=sizes,
                            c=colors, alpha=0.7, edgecolors='white', linewidth=2)
         
-        for i, school in enumerate(schools):
-            ax.annotate(school, (penetration[i], spell_counts[i]),
+        for school, x, y in zip(schools, penetration, spell_counts):
+            ax.annotate(school, (x, y),
                        xytext=(8, 8), textcoords='offset points',
                        fontsize=10, fontweight='bold', color='#333333',
                        bbox=dict(boxstyle='round,pad=0.3', facecolor='white', alpha=0.9))
@@ -837,11 +1004,7 @@ class DNDEnhancedVisualizer:
                    fontsize=16, fontweight='bold', pad=20, color='#2C3E50')
         ax.grid(alpha=0.3, color='#DDDDDD')
         ax.set_facecolor('white')
-        
-        plt.tight_layout()
-        plt.savefig(os.path.join(self.output_dir, "9_school_dominance_ecosystem.png"), 
-                   dpi=300, bbox_inches='tight', facecolor='white')
-        plt.close()
+        self._savefig("9_school_dominance_ecosystem.png")
 
     def plot_10_spell_bridge_analysis(self):
         """10. Spell Bridge Analysis"""
@@ -851,40 +1014,28 @@ class DNDEnhancedVisualizer:
             print("No Neo4j analyzer available")
             return
         
-        with self.neo4j_analyzer.driver.session() as session:
-            # Query dal neo4j_analyzer per bridge spells
-            bridge_query = """
-            MATCH (c1:Class)-[:CAN_CAST]->(s:Spell)<-[:CAN_CAST]-(c2:Class)
-            WHERE c1.name < c2.name
-            WITH s, count(DISTINCT [c1.name, c2.name]) as bridge_count
-            ORDER BY bridge_count DESC
-            RETURN s.name as spell_name, s.level as level, bridge_count
-            LIMIT 15
-            """
-            
-            data = session.run(bridge_query).data()
+        data = self.get_neo4j_data()["bridge"]
         
         if not data:
             print("No bridge spell data available")
             return
         
-        fig, ax = plt.subplots(figsize=(14, 8))
-        fig.patch.set_facecolor('white')
+        fig, ax = self._new_axes(figsize=(14, 8))
         
         spells = [item['spell_name'] for item in data[:10]]
         bridge_counts = [item['bridge_count'] for item in data[:10]]
         levels = [item['level'] for item in data[:10]]
         
-        colors = [self.color_palettes['soft_greens'][min(level, 5)] for level in levels]
+        palette = np.asarray(self.color_palettes['soft_greens'])
+        colors = palette[np.minimum(np.asarray(levels, dtype=np.int64), 5)].tolist()
         
         bars = ax.bar(range(len(spells)), bridge_counts, color=colors, alpha=0.8,
                      edgecolor='white', linewidth=2)
         
         # Add level labels on bars
-        for i, (bar, level) in enumerate(zip(bars, levels)):
-            ax.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.1,
-                   f'L{level}', ha='center', fontweight='bold', fontsize=9,
-                   bbox=dict(boxstyle='round,pad=0.2', facecolor='white', alpha=0.8))
+        ax.bar_label(bars, labels=[f'L{level}' for level in levels], padding=3,
+                     fontweight='bold', fontsize=9,
+                     bbox=dict(boxstyle='round,pad=0.2', facecolor='white', alpha=0.8))
         
         ax.set_xlabel('Spells', fontsize=12, fontweight='bold', color='#444444')
         ax.set_ylabel('Bridge Connections', fontsize=12, fontweight='bold', color='#444444')
@@ -894,11 +1045,7 @@ class DNDEnhancedVisualizer:
         ax.set_xticklabels(spells, rotation=45, ha='right', fontsize=9)
         ax.grid(axis='y', alpha=0.3, color='#DDDDDD')
         ax.set_facecolor('white')
-        
-        plt.tight_layout()
-        plt.savefig(os.path.join(self.output_dir, "10_spell_bridge_analysis.png"), 
-                   dpi=300, bbox_inches='tight', facecolor='white')
-        plt.close()
+        self._savefig("10_spell_bridge_analysis.png", bottom=0.22)
 
     def plot_11_school_competition_matrix(self):
         """11. School Competition Matrix"""
@@ -908,19 +1055,7 @@ class DNDEnhancedVisualizer:
             print("No Neo4j analyzer available")
             return
         
-        with self.neo4j_analyzer.driver.session() as session:
-            # Query dal neo4j_analyzer per school competition
-            competition_query = """
-            MATCH (s1:School)<-[:BELONGS_TO]-(spell1:Spell)<-[:CAN_CAST]-(c:Class)
-            MATCH (c)-[:CAN_CAST]->(spell2:Spell)-[:BELONGS_TO]->(s2:School)
-            WHERE s1.name < s2.name
-            WITH s1, s2, count(DISTINCT c) as shared_classes
-            WHERE shared_classes > 2
-            RETURN s1.name as school1, s2.name as school2, shared_classes
-            ORDER BY shared_classes DESC
-            """
-            
-            data = session.run(competition_query).data()
+        data = self.get_neo4j_data()["competition"]
         
         if not data:
             print("No school competition data available")
@@ -933,15 +1068,13 @@ class DNDEnhancedVisualizer:
         
         school_to_idx = {school: i for i, school in enumerate(schools)}
         
-        for item in data:
-            i = school_to_idx[item['school1']]
-            j = school_to_idx[item['school2']]
-            shared = item['shared_classes']
-            matrix[i, j] = shared
-            matrix[j, i] = shared  # Make symmetric
+        s1 = np.fromiter((school_to_idx[item['school1']] for item in data), dtype=np.int32)
+        s2 = np.fromiter((school_to_idx[item['school2']] for item in data), dtype=np.int32)
+        vals = np.fromiter((item['shared_classes'] for item in data), dtype=np.int32)
+        matrix[s1, s2] = vals
+        matrix[s2, s1] = vals  # Make symmetric
         
-        fig, ax = plt.subplots(figsize=(10, 8))
-        fig.patch.set_facecolor('white')
+        fig, ax = self._new_axes(figsize=(10, 8))
         
         # Custom colormap for competition
         colors = ['#FFFFFF', '#FFE5E5', '#FFCCCC', '#FF9999', '#FF6666']
@@ -966,11 +1099,7 @@ class DNDEnhancedVisualizer:
         
         ax.set_title('School Competition Matrix\nShared Classes Analysis', 
                    fontsize=16, fontweight='bold', pad=20, color='#2C3E50')
-        
-        plt.tight_layout()
-        plt.savefig(os.path.join(self.output_dir, "11_school_competition_matrix.png"), 
-                   dpi=300, bbox_inches='tight', facecolor='white')
-        plt.close()
+        self._savefig("11_school_competition_matrix.png", left=0.18, bottom=0.22)
 
     def plot_12_component_dependency_analysis(self):
         """12. Component Dependency Analysis"""
@@ -980,36 +1109,13 @@ class DNDEnhancedVisualizer:
             print("No Neo4j analyzer available")
             return
         
-        with self.neo4j_analyzer.driver.session() as session:
-            # Query dal neo4j_analyzer per component analysis
-            component_query = """
-            MATCH (s:Spell)
-            WITH s,
-                 CASE WHEN 'V' IN s.components THEN 1 ELSE 0 END as needs_verbal,
-                 CASE WHEN 'S' IN s.components THEN 1 ELSE 0 END as needs_somatic,
-                 CASE WHEN 'M' IN s.components THEN 1 ELSE 0 END as needs_material,
-                 s.level as spell_level
-            WITH spell_level,
-                 sum(needs_verbal) as verbal_count,
-                 sum(needs_somatic) as somatic_count,
-                 sum(needs_material) as material_count,
-                 count(s) as total_spells
-            WHERE spell_level <= 9
-            ORDER BY spell_level
-            RETURN spell_level,
-                   round(verbal_count * 100.0 / total_spells, 1) as verbal_pct,
-                   round(somatic_count * 100.0 / total_spells, 1) as somatic_pct,
-                   round(material_count * 100.0 / total_spells, 1) as material_pct
-            """
-            
-            data = session.run(component_query).data()
+        data = self.get_neo4j_data()["component"]
         
         if not data:
             print("No component dependency data available")
             return
         
-        fig, ax = plt.subplots(figsize=(14, 8))
-        fig.patch.set_facecolor('white')
+        fig, ax = self._new_axes(figsize=(14, 8))
         
         levels = [item['spell_level'] for item in data]
         verbal_pcts = [item['verbal_pct'] for item in data]
@@ -1032,11 +1138,7 @@ class DNDEnhancedVisualizer:
         ax.legend()
         ax.grid(axis='y', alpha=0.3, color='#DDDDDD')
         ax.set_facecolor('white')
-        
-        plt.tight_layout()
-        plt.savefig(os.path.join(self.output_dir, "12_component_dependency_analysis.png"), 
-                   dpi=300, bbox_inches='tight', facecolor='white')
-        plt.close()
+        self._savefig("12_component_dependency_analysis.png")
 
     def plot_13_power_progression_curves(self):
         """13. Power Progression Curves"""
@@ -1046,27 +1148,13 @@ class DNDEnhancedVisualizer:
             print("No Neo4j analyzer available")
             return
         
-        with self.neo4j_analyzer.driver.session() as session:
-            # Query dal neo4j_analyzer per power curves
-            progression_query = """
-            MATCH (s:Spell)-[:BELONGS_TO]->(school:School)
-            WITH school.name as school_name,
-                 s.level as level,
-                 count(s) as spell_count
-            ORDER BY school_name, level
-            WITH school_name,
-                 collect({level: level, count: spell_count}) as distribution
-            RETURN school_name, distribution
-            """
-            
-            data = session.run(progression_query).data()
+        data = self.get_neo4j_data()["progression"]
         
         if not data:
             print("No power progression data available")
             return
         
-        fig, ax = plt.subplots(figsize=(14, 8))
-        fig.patch.set_facecolor('white')
+        fig, ax = self._new_axes(figsize=(14, 8))
         
         colors = self.color_palettes['gradient_pastels']
         
@@ -1104,11 +1192,7 @@ class DNDEnhancedVisualizer:
         legend = ax.legend(frameon=True, fancybox=True, shadow=True, fontsize=10, 
                           loc='upper right')
         legend.get_frame().set_facecolor('white')
-        
-        plt.tight_layout()
-        plt.savefig(os.path.join(self.output_dir, "13_power_progression_curves.png"), 
-                   dpi=300, bbox_inches='tight', facecolor='white')
-        plt.close()
+        self._savefig("13_power_progression_curves.png")
 
     # ==========================================
     # MAIN EXECUTION
@@ -1163,13 +1247,21 @@ class DNDEnhancedVisualizer:
 
     def close_connections(self):
         """Chiude le connessioni ai database"""
+        plt.close(self._fig)
+        
         if self.mongo_client is not None:
             self.mongo_client.close()
             print("✅ MongoDB connection closed")
         
+        if self.neo4j_session is not None:
+            self.neo4j_session.close()
+        
+        # L'analyzer condivide il driver: chiuderlo rilascia anche il pool del visualizer
         if self.neo4j_analyzer is not None:
             self.neo4j_analyzer.close()
             print("✅ Neo4j connection closed")
+        elif self.neo4j_driver is not None:
+            self.neo4j_driver.close()
 
 # ==========================================
 # MAIN EXECUTION
@@ -1,12 +1,106 @@
 import json
 import os
+import re
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import orjson
+except ImportError:
+    orjson = None  # Senza orjson si usa il modulo json standard
+
+def load_json(path):
+    """Legge un file JSON (con orjson se disponibile)"""
+    if orjson is not None:
+        return orjson.loads(path.read_bytes())
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def dump_json(path, item):
+    """Scrive un oggetto come JSON indentato con una sola write (con orjson se disponibile)"""
+    if orjson is not None:
+        path.write_bytes(orjson.dumps(item, option=orjson.OPT_INDENT_2))
+    else:
+        path.write_text(json.dumps(item, indent=2, ensure_ascii=False), encoding='utf-8')
+
+# Caratteri ammessi nei nomi file: alfanumerici, spazio, '-' e '_'
+_SAFE_RE = re.compile(r'[^\w \-]+')
+# Tabella che elimina i caratteri ASCII non ammessi in un solo passaggio
+_TRANS = str.maketrans({c: None for c in map(chr, range(128)) if not (c.isalnum() or c in ' -_')})
+
+def safe_filename(item_name):
+    """Pulisce il nome di un item per usarlo come nome file"""
+    if item_name.isascii():
+        safe_name = item_name.translate(_TRANS)
+    else:
+        safe_name = _SAFE_RE.sub('', item_name)
+    return safe_name.strip().replace(' ', '_')
+
+def process_json_file(json_file):
+    """
+    Divide un singolo file JSON in un file per item.
+    Restituisce (nome file, file creati, messaggi) così che l'output
+    dei processi paralleli venga stampato in ordine dal chiamante.
+    """
+    log = [f"\nProcessando: {json_file.name}"]
+    created = 0
+    
+    try:
+        # Legge il file JSON
+        data = load_json(json_file)
+        
+        # Estrae il nome dalla table_info
+        if 'table_info' not in data or 'name' not in data['table_info']:
+            log.append(f"  ⚠️  Saltato: manca 'table_info.name' in {json_file.name}")
+            return json_file.name, created, log
+            
+        folder_name = data['table_info']['name']
+        
+        # Crea la sottocartella
+        output_folder = json_file.parent / folder_name
+        output_folder.mkdir(exist_ok=True)
+        log.append(f"  📁 Creata cartella: {folder_name}")
+        
+        # Processa gli items
+        if 'items' not in data:
+            log.append(f"  ⚠️  Nessun array 'items' trovato in {json_file.name}")
+            return json_file.name, created, log
+            
+        items = data['items']
+        if not items:
+            log.append(f"  ⚠️  Array 'items' vuoto in {json_file.name}")
+            return json_file.name, created, log
+        
+        # Crea un file JSON per ogni item
+        for item in items:
+            if 'name' not in item:
+                log.append(f"  ⚠️  Item senza 'name' saltato")
+                continue
+                
+            safe_name = safe_filename(item['name'])
+            item_file = output_folder / f"{safe_name}.json"
+            
+            # Scrive il file JSON per questo item
+            dump_json(item_file, item)
+            created += 1
+            
+            log.append(f"  ✅ Creato: {folder_name}/{safe_name}.json")
+        
+        log.append(f"  🎉 Completato {json_file.name}: {len(items)} file creati")
+        
+    except json.JSONDecodeError as e:
+        log.append(f"  ❌ Errore parsing JSON in {json_file.name}: {e}")
+    except Exception as e:
+        log.append(f"  ❌ Errore generico con {json_file.name}: {e}")
+    
+    return json_file.name, created, log
 
 def process_json_files(source_folder="dnd_data"):
     """
     Processa tutti i file JSON nella cartella specificata.
     Per ogni file crea una sottocartella col nome dell'oggetto principale
     e divide gli items in file JSON separati.
+    I file sono indipendenti e vengono elaborati in parallelo su più processi.
     """
     
     # Verifica che la cartella esista
@@ -24,61 +118,9 @@ def process_json_files(source_folder="dnd_data"):
     
     print(f"Trovati {len(json_files)} file JSON da processare...")
     
-    for json_file in json_files:
-        print(f"\nProcessando: {json_file.name}")
-        
-        try:
-            # Legge il file JSON
-            with open(json_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            # Estrae il nome dalla table_info
-            if 'table_info' not in data or 'name' not in data['table_info']:
-                print(f"  ⚠️  Saltato: manca 'table_info.name' in {json_file.name}")
-                continue
-                
-            folder_name = data['table_info']['name']
-            
-            # Crea la sottocartella
-            output_folder = source_path / folder_name
-            output_folder.mkdir(exist_ok=True)
-            print(f"  📁 Creata cartella: {folder_name}")
-            
-            # Processa gli items
-            if 'items' not in data:
-                print(f"  ⚠️  Nessun array 'items' trovato in {json_file.name}")
-                continue
-                
-            items = data['items']
-            if not items:
-                print(f"  ⚠️  Array 'items' vuoto in {json_file.name}")
-                continue
-            
-            # Crea un file JSON per ogni item
-            for item in items:
-                if 'name' not in item:
-                    print(f"  ⚠️  Item senza 'name' saltato")
-                    continue
-                    
-                item_name = item['name']
-                # Pulisce il nome per usarlo come nome file
-                safe_name = "".join(c for c in item_name if c.isalnum() or c in (' ', '-', '_')).strip()
-                safe_name = safe_name.replace(' ', '_')
-                
-                item_file = output_folder / f"{safe_name}.json"
-                
-                # Scrive il file JSON per questo item
-                with open(item_file, 'w', encoding='utf-8') as f:
-                    json.dump(item, f, indent=2, ensure_ascii=False)
-                
-                print(f"  ✅ Creato: {folder_name}/{safe_name}.json")
-            
-            print(f"  🎉 Completato {json_file.name}: {len(items)} file creati")
-            
-        except json.JSONDecodeError as e:
-            print(f"  ❌ Errore parsing JSON in {json_file.name}: {e}")
-        except Exception as e:
-            print(f"  ❌ Errore generico con {json_file.name}: {e}")
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as pool:
+        for _, _, log in pool.map(process_json_file, json_files, chunksize=4):
+            print("\n".join(log))
     
     print(f"\n🏁 Processamento completato!")
 
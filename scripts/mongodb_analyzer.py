@@ -7,15 +7,198 @@ from datetime import datetime
 from typing import Dict, List, Any, Optional
 import json
 from collections import defaultdict, Counter
+import operator
+import bisect
+import traceback
 from pprint import pprint
 import sys
 import statistics
+import shelve
+import hashlib
+import glob
+import os
+
+# File shelve con i risultati delle aggregazioni già eseguite
+ANALYSIS_CACHE_PATH = '.analysis_cache'
+
+# Collezioni lette dalle analisi: i loro conteggi invalidano la cache
+ANALYZED_COLLECTIONS = ("classes", "spells", "equipment", "races")
+
+# Campi materializzati sull'equipaggiamento: costo normalizzato in cp e categoria
+EQUIPMENT_MATERIALIZED_FIELDS = {
+    "_cost_in_cp": {
+        "$switch": {
+            "branches": [
+                {"case": {"$eq": ["$cost.unit", "cp"]}, "then": "$cost.quantity"},
+                {"case": {"$eq": ["$cost.unit", "sp"]}, "then": {"$multiply": ["$cost.quantity", 10]}},
+                {"case": {"$eq": ["$cost.unit", "gp"]}, "then": {"$multiply": ["$cost.quantity", 100]}},
+                {"case": {"$eq": ["$cost.unit", "pp"]}, "then": {"$multiply": ["$cost.quantity", 1000]}}
+            ],
+            "default": 0
+        }
+    },
+    "_category": {"$ifNull": ["$equipment_category.name", "Unknown"]}
+}
+
+def materialize_equipment_fields(db) -> int:
+    """Precalcola _cost_in_cp e _category sui documenti dell'equipaggiamento che non li hanno ancora"""
+    result = db.equipment.update_many(
+        {"_cost_in_cp": {"$exists": False}},
+        [{"$set": EQUIPMENT_MATERIALIZED_FIELDS}]
+    )
+    db.equipment.create_index([("_category", 1), ("_cost_in_cp", 1)])
+    return result.modified_count
+
+# Limiti inferiori dei tier competitivi delle razze (D, C, B, A, S)
+RACE_TIER_BOUNDARIES = [float("-inf"), 6, 8, 10, 12, float("inf")]
+RACE_TIER_LABELS = ["D-Tier", "C-Tier", "B-Tier", "A-Tier", "S-Tier"]
+
+# Gate di ingresso delle analisi razziali: esclude stub senza bonus alle caratteristiche
+RACE_ANALYSIS_FILTER = {
+    "ability_bonuses": {"$exists": True, "$ne": []},
+    "competitive_index": {"$exists": True}
+}
+
+def race_tier_label(competitive_index: float) -> str:
+    """Restituisce il tier competitivo corrispondente all'indice (o al limite inferiore di un bucket)"""
+    return RACE_TIER_LABELS[bisect.bisect_right(RACE_TIER_BOUNDARIES, competitive_index) - 1]
+
+# Punteggi razziali: dipendono solo da attributi statici, quindi vengono materializzati una volta.
+# Un solo stage: i $let annidati calcolano caratteristiche di base, metriche e indice in un'unica passata.
+RACE_SCORE_STAGES = [
+    {"$replaceWith": {"$let": {
+        # Caratteristiche razziali normalizzate
+        "vars": {
+            "total_ability_bonuses": {
+                "$reduce": {
+                    "input": {"$ifNull": ["$ability_bonuses", []]},
+                    "initialValue": 0,
+                    "in": {"$add": ["$$value", {"$ifNull": ["$$this.bonus", 0]}]}
+                }
+            },
+            "unique_ability_bonuses": {"$size": {"$ifNull": ["$ability_bonuses", []]}},
+            "base_speed": {"$ifNull": ["$speed", 30]},
+            "special_abilities_count": {"$size": {"$ifNull": ["$traits", []]}},
+            "languages_count": {"$size": {"$ifNull": ["$languages", []]}},
+            "proficiencies_count": {"$size": {"$ifNull": ["$proficiencies", []]}}
+        },
+        "in": {"$let": {
+            # Metriche di competizione
+            "vars": {
+                "stat_optimization_score": {
+                    "$add": [
+                        {"$multiply": ["$$total_ability_bonuses", 2]},
+                        {"$multiply": ["$$unique_ability_bonuses", 1.5]}
+                    ]
+                },
+                "versatility_score": {
+                    "$add": [
+                        {"$multiply": ["$$special_abilities_count", 1.5]},
+                        {"$multiply": ["$$languages_count", 0.5]},
+                        {"$multiply": ["$$proficiencies_count", 1.0]}
+                    ]
+                },
+                "mobility_score": {
+                    "$multiply": [
+                        {"$divide": ["$$base_speed", 30]},
+                        3
+                    ]
+                },
+                "size_advantage": {
+                    "$switch": {
+                        "branches": [
+                            {"case": {"$eq": ["$size", "Small"]}, "then": 2},
+                            {"case": {"$eq": ["$size", "Medium"]}, "then": 3},
+                            {"case": {"$eq": ["$size", "Large"]}, "then": 1}
+                        ],
+                        "default": 1
+                    }
+                }
+            },
+            # Documento finale: solo _id e punteggi, pronti per il $merge
+            "in": {
+                "_id": "$_id",
+                "total_ability_bonuses": "$$total_ability_bonuses",
+                "unique_ability_bonuses": "$$unique_ability_bonuses",
+                "base_speed": "$$base_speed",
+                "size_category": "$size",
+                "special_abilities_count": "$$special_abilities_count",
+                "languages_count": "$$languages_count",
+                "proficiencies_count": "$$proficiencies_count",
+                "stat_optimization_score": "$$stat_optimization_score",
+                "versatility_score": "$$versatility_score",
+                "mobility_score": "$$mobility_score",
+                "size_advantage": "$$size_advantage",
+                "competitive_index": {
+                    "$add": [
+                        {"$multiply": ["$$stat_optimization_score", 0.4]},
+                        {"$multiply": ["$$versatility_score", 0.3]},
+                        {"$multiply": ["$$mobility_score", 0.2]},
+                        {"$multiply": ["$$size_advantage", 0.1]}
+                    ]
+                },
+                "specialization_type": {
+                    "$switch": {
+                        "branches": [
+                            {"case": {"$gte": ["$$stat_optimization_score", 8]}, "then": "Stat Specialist"},
+                            {"case": {"$gte": ["$$versatility_score", 6]}, "then": "Utility Specialist"},
+                            {"case": {"$gte": ["$$mobility_score", 4]}, "then": "Mobility Specialist"},
+                            {"case": {"$gte": ["$$special_abilities_count", 4]}, "then": "Feature Rich"}
+                        ],
+                        "default": "Balanced"
+                    }
+                }
+            }
+        }}
+    }}}
+]
+
+def materialize_race_scores(db) -> int:
+    """Salva i punteggi competitivi sulle razze che non li hanno ancora (via $merge) e crea l'indice per il sort"""
+    pending_filter = {"specialization_type": {"$exists": False}}
+    pending = db.races.count_documents(pending_filter)
+    if pending:
+        db.races.aggregate([
+            {"$match": pending_filter},
+            *RACE_SCORE_STAGES,
+            {"$merge": {"into": "races", "on": "_id", "whenMatched": "merge", "whenNotMatched": "discard"}}
+        ])
+    # Parziale: copre solo le razze che superano il $match di ingresso delle analisi
+    db.races.create_index(
+        [("competitive_index", -1)],
+        name="competitive_index_ranked",
+        partialFilterExpression={"ability_bonuses": {"$exists": True}}
+    )
+    return pending
 
 class DNDDataAnalyzer:
     
-    def __init__(self, db):
+    def __init__(self, db, cache_path: Optional[str] = None, materialize: bool = False,
+                 refresh: bool = False):
+        """
+        materialize=True precalcola i campi di costo dell'equipaggiamento e i punteggi delle razze
+        mancanti (scrive sulle collezioni); di norma lo fa già run_import, quindi i consumatori
+        in sola lettura lo lasciano a False. I campi riscritti cambiano i risultati, per cui
+        materialize=True (come refresh=True) svuota anche la cache delle analisi
+        """
         self.db = db
+        self.cache_path = cache_path
+        # Risultati già calcolati in questa sessione: i dati sono statici dopo l'import
+        self.results_cache: Dict[str, List[Dict[str, Any]]] = {}
         self.verify_collections()
+        if materialize and self.collection_counts.get("equipment"):
+            materialize_equipment_fields(self.db)
+        if materialize and self.collection_counts.get("races"):
+            materialize_race_scores(self.db)
+        if materialize or refresh:
+            self.clear_cache()
+    
+    def clear_cache(self):
+        """Svuota la cache delle aggregazioni in memoria e su disco (shelve può creare più file)"""
+        self.results_cache.clear()
+        if self.cache_path:
+            for cache_file in glob.glob(self.cache_path + '*'):
+                os.remove(cache_file)
         
     def verify_collections(self):
         """Verifica le collezioni disponibili nel database"""
@@ -40,6 +223,45 @@ class DNDDataAnalyzer:
         """Stampa un sub-header per le sottosezioni"""
         print(f"\n--- {title} ---")
 
+    def run_aggregation(self, collection_name: str, pipeline: List[Dict[str, Any]],
+                        **aggregate_options) -> List[Dict[str, Any]]:
+        """Esegue una pipeline riusando il risultato già calcolato (in memoria o su disco) se pipeline e dati non sono cambiati"""
+        # I conteggi letti una volta da verify_collections identificano lo stato dei dati
+        collection_stats = [self.collection_counts.get(name, 0) for name in ANALYZED_COLLECTIONS]
+        key = hashlib.sha1(
+            json.dumps([collection_name, pipeline, collection_stats], sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+        
+        if key in self.results_cache:
+            return self.results_cache[key]
+        
+        if not self.cache_path:
+            results = list(self.db[collection_name].aggregate(pipeline, **aggregate_options))
+        else:
+            with shelve.open(self.cache_path) as cache:
+                if key not in cache:
+                    cache[key] = list(self.db[collection_name].aggregate(pipeline, **aggregate_options))
+                results = cache[key]
+        
+        self.results_cache[key] = results
+        return results
+
+    @staticmethod
+    def tier_label_stage(value: str, cut_points: List[float], labels: List[str],
+                         tier_field: str) -> Dict[str, Any]:
+        """
+        Assegna un tier a ogni documento con un unico $set sulla lista dei limiti, invece di una
+        cascata di $switch: l'indice del tier è il numero di limiti <= valore (valori mancanti -> primo tier)
+        """
+        return {"$set": {
+            tier_field: {
+                "$arrayElemAt": [labels, {"$size": {"$filter": {
+                    "input": cut_points,
+                    "cond": {"$lte": ["$$this", value]}
+                }}}]
+            }
+        }}
+
     # ================
     # CLASS ANALYSIS - CORE METRICS
     # ================
@@ -140,11 +362,29 @@ class DNDDataAnalyzer:
                 }
             }},
             
-            {"$sort": {"overall_performance": -1}}
+            {"$sort": {"overall_performance": -1}},
+            
+            # Stage 5: Restituisce solo i campi stampati (scarta class_spells)
+            {"$project": {
+                "_id": 0,
+                "name": 1,
+                "power_score": 1,
+                "survivability_score": 1,
+                "versatility_score": 1,
+                "specialization_ratio": 1,
+                "overall_performance": 1,
+                "total_spells": 1,
+                "unique_spells": 1,
+                "damage_spells": 1,
+                "high_level_spells": 1,
+                "hit_die": 1,
+                "proficiency_count": 1,
+                "saving_throw_count": 1
+            }}
         ]
         
         try:
-            results = list(self.db.classes.aggregate(pipeline))
+            results = self.run_aggregation("classes", pipeline)
             
             if results:
                 self.print_subsection("Class Performance Metrics")
@@ -305,11 +545,20 @@ class DNDDataAnalyzer:
                 }
             }},
             
-            {"$sort": {"avg_spell_level": -1}}
+            {"$sort": {"avg_spell_level": -1}},
+            
+            # Stage 6: Restituisce solo i campi stampati
+            {"$project": {
+                "total_spells": 1,
+                "avg_spell_level": 1,
+                "cantrip_percentage": 1,
+                "high_level_percentage": 1,
+                "level_distribution": 1
+            }}
         ]
         
         try:
-            results = list(self.db.spells.aggregate(pipeline))
+            results = self.run_aggregation("spells", pipeline)
             
             if results:
                 self.print_subsection("Spell Distribution Analysis")
@@ -504,11 +753,22 @@ class DNDDataAnalyzer:
                     }
                 }},
                 
-                {"$sort": {"self_sufficiency_score": -1}}
+                {"$sort": {"self_sufficiency_score": -1}},
+                
+                # Stage 5: Restituisce solo i campi stampati (scarta class_spells)
+                {"$project": {
+                    "_id": 0,
+                    "name": 1,
+                    "material_dependency_ratio": 1,
+                    "concentration_dependency_ratio": 1,
+                    "component_complexity_score": 1,
+                    "self_sufficiency_score": 1,
+                    "dependency_category": 1
+                }}
             ]
             
         try:
-            results = list(self.db.classes.aggregate(pipeline))
+            results = self.run_aggregation("classes", pipeline)
             
             if results:
                 self.print_subsection("Resource Dependency Rankings")
@@ -534,13 +794,9 @@ class DNDDataAnalyzer:
                 print("DEPENDENCY CATEGORIES BREAKDOWN:")
                 print("="*50)
                 
-                categories = {}
+                categories = defaultdict(list)
                 for class_data in results:
-                    cat = class_data.get("dependency_category", "Unknown")
-                    name = class_data.get("name", "Unknown")
-                    if cat not in categories:
-                        categories[cat] = []
-                    categories[cat].append(name)
+                    categories[class_data.get("dependency_category", "Unknown")].append(class_data.get("name", "Unknown"))
                 
                 for category, classes in categories.items():
                     print(f"\n{category}: {len(classes)} classes")
@@ -548,7 +804,6 @@ class DNDDataAnalyzer:
                     
         except Exception as e:
                 print(f"Error in dependency analysis: {e}")
-                import traceback
                 traceback.print_exc()
 
     # ================
@@ -641,11 +896,19 @@ class DNDDataAnalyzer:
                 }
             }},
             
-            {"$sort": {"rarity_value": -1}}
+            {"$sort": {"rarity_value": -1}},
+            
+            # Stage 6: Restituisce solo i campi stampati
+            {"$project": {
+                "total_spells": 1,
+                "overall_avg_utility": 1,
+                "rarity_value": 1,
+                "level_breakdown": 1
+            }}
         ]
         
         try:
-            results = list(self.db.spells.aggregate(pipeline))
+            results = self.run_aggregation("spells", pipeline)
             
             if results:
                 self.print_subsection("Spell Rarity Distribution")
@@ -699,25 +962,15 @@ class DNDDataAnalyzer:
             # Stage 1: Match le spell con i dati delle scuole di magia
             {"$match": {"school.name": {"$exists": True, "$ne": None}}},
             
-            # Stage 2: Aggiunge gli indicatori di valore di mercato
-            {"$addFields": {
-                "class_access_count": {"$size": {"$ifNull": ["$classes", []]}},
-                "has_damage": {"$ne": ["$damage", None]},
-                "is_high_level": {"$gte": ["$level", 5]},
-                "is_concentration": {"$eq": ["$concentration", True]},
-                "has_material": {"$in": ["M", {"$ifNull": ["$components", []]}]},
-                "school_name": "$school.name"
-            }},
-            
-            # Stage 3: Calcola le metriche di mercato per spell
+            # Stage 2: Calcola le metriche di mercato per spell
             {"$addFields": {
                 "exclusivity_value": {
                     "$switch": {
                         "branches": [
-                            {"case": {"$eq": ["$class_access_count", 1]}, "then": 5},
-                            {"case": {"$eq": ["$class_access_count", 2]}, "then": 4},
-                            {"case": {"$lte": ["$class_access_count", 4]}, "then": 3},
-                            {"case": {"$lte": ["$class_access_count", 7]}, "then": 2}
+                            {"case": {"$eq": [{"$size": {"$ifNull": ["$classes", []]}}, 1]}, "then": 5},
+                            {"case": {"$eq": [{"$size": {"$ifNull": ["$classes", []]}}, 2]}, "then": 4},
+                            {"case": {"$lte": [{"$size": {"$ifNull": ["$classes", []]}}, 4]}, "then": 3},
+                            {"case": {"$lte": [{"$size": {"$ifNull": ["$classes", []]}}, 7]}, "then": 2}
                         ],
                         "default": 1
                     }
@@ -725,21 +978,21 @@ class DNDDataAnalyzer:
                 "power_value": {
                     "$add": [
                         {"$multiply": ["$level", 1]},
-                        {"$cond": [{"$eq": ["$has_damage", True]}, 3, 0]},
-                        {"$cond": [{"$eq": ["$is_high_level", True]}, 2, 0]}
+                        {"$cond": [{"$ne": ["$damage", None]}, 3, 0]},
+                        {"$cond": [{"$gte": ["$level", 5]}, 2, 0]}
                     ]
                 },
                 "complexity_cost": {
                     "$add": [
-                        {"$cond": [{"$eq": ["$is_concentration", True]}, 1, 0]},
-                        {"$cond": [{"$eq": ["$has_material", True]}, 1, 0]}
+                        {"$cond": [{"$eq": ["$concentration", True]}, 1, 0]},
+                        {"$cond": [{"$in": ["M", {"$ifNull": ["$components", []]}]}, 1, 0]}
                     ]
                 }
             }},
             
-            # Stage 4: Raggruppa per scuola
+            # Stage 3: Raggruppa per scuola
             {"$group": {
-                "_id": "$school_name",
+                "_id": "$school.name",
                 "total_spells": {"$sum": 1},
                 "avg_exclusivity": {"$avg": "$exclusivity_value"},
                 "avg_power": {"$avg": "$power_value"},
@@ -747,13 +1000,13 @@ class DNDDataAnalyzer:
                 "total_market_value": {"$sum": {"$multiply": ["$exclusivity_value", "$power_value"]}},
                 "exclusive_spells": {"$sum": {"$cond": [{"$eq": ["$exclusivity_value", 5]}, 1, 0]}},
                 "high_power_spells": {"$sum": {"$cond": [{"$gte": ["$power_value", 7]}, 1, 0]}},
-                "damage_spells": {"$sum": {"$cond": [{"$eq": ["$has_damage", True]}, 1, 0]}},
-                "high_level_spells": {"$sum": {"$cond": [{"$eq": ["$is_high_level", True]}, 1, 0]}},
+                "damage_spells": {"$sum": {"$cond": [{"$ne": ["$damage", None]}, 1, 0]}},
+                "high_level_spells": {"$sum": {"$cond": [{"$gte": ["$level", 5]}, 1, 0]}},
                 "level_distribution": {"$push": "$level"},
                 "class_reach": {"$addToSet": "$classes"}
             }},
             
-            # Stage 5: Calcola le metriche di mercato
+            # Stage 4: Calcola le metriche di mercato
             {"$addFields": {
                 "market_dominance": {"$divide": ["$total_market_value", "$total_spells"]},
                 "exclusivity_ratio": {"$divide": ["$exclusive_spells", "$total_spells"]},
@@ -762,7 +1015,7 @@ class DNDDataAnalyzer:
                 "unique_class_access": {"$size": "$class_reach"}
             }},
             
-            # Stage 6: Determina la posizione di mercato
+            # Stage 5: Determina la posizione di mercato
             {"$addFields": {
                 "market_position": {
                     "$switch": {
@@ -778,11 +1031,40 @@ class DNDDataAnalyzer:
                 }
             }},
             
-            {"$sort": {"market_dominance": -1}}
+            # Stage 6: Tabella completa ridotta ai campi mostrati + top 3 con sort/limit lato server
+            {"$facet": {
+                "overview": [
+                    {"$sort": {"market_dominance": -1}},
+                    {"$project": {
+                        "total_spells": 1,
+                        "market_dominance": 1,
+                        "exclusivity_ratio": 1,
+                        "power_ratio": 1,
+                        "market_position": 1
+                    }}
+                ],
+                "top": [
+                    {"$sort": {"market_dominance": -1}},
+                    {"$limit": 3},
+                    {"$project": {
+                        "market_position": 1,
+                        "total_market_value": 1,
+                        "avg_spell_level": 1,
+                        "unique_class_access": 1,
+                        "exclusive_spells": 1,
+                        "exclusivity_ratio": 1,
+                        "high_power_spells": 1,
+                        "power_ratio": 1,
+                        "damage_spells": 1
+                    }}
+                ]
+            }}
         ]
         
         try:
-            results = list(self.db.spells.aggregate(pipeline))
+            facets = next(iter(self.run_aggregation("spells", pipeline)), {})
+            results = facets.get("overview", [])
+            top_schools = facets.get("top", [])
             
             if results:
                 self.print_subsection("Magic School Market Analysis")
@@ -805,7 +1087,7 @@ class DNDDataAnalyzer:
                 print("TOP 3 SCHOOLS - MARKET BREAKDOWN:")
                 print("="*60)
                 
-                for i, school in enumerate(results[:3], 1):
+                for i, school in enumerate(top_schools, 1):
                     name = school["_id"]
                     print(f"\n#{i} - {name} ({school['market_position']}):")
                     print(f"  Total Market Value: {school['total_market_value']:.0f}")
@@ -833,39 +1115,17 @@ class DNDDataAnalyzer:
                 "cost.unit": {"$exists": True, "$ne": None}
             }},
             
-            # Stage 2: Normalizza i costi e aggiunge gli indicatori di mercato
+            # Stage 2: Legge i costi materializzati e aggiunge gli indicatori di mercato
             {"$addFields": {
-                "cost_in_gp": {
-                    "$switch": {
-                        "branches": [
-                            {"case": {"$eq": ["$cost.unit", "cp"]}, "then": {"$divide": ["$cost.quantity", 100]}},
-                            {"case": {"$eq": ["$cost.unit", "sp"]}, "then": {"$divide": ["$cost.quantity", 10]}},
-                            {"case": {"$eq": ["$cost.unit", "gp"]}, "then": "$cost.quantity"},
-                            {"case": {"$eq": ["$cost.unit", "pp"]}, "then": {"$multiply": ["$cost.quantity", 10]}}
-                        ],
-                        "default": 0
-                    }
-                },
+                "cost_in_gp": {"$divide": ["$_cost_in_cp", 100]},
                 "weight_factor": {"$ifNull": ["$weight", 0]},
-                "category": {"$ifNull": ["$equipment_category.name", "Unknown"]},
+                "category": "$_category",
                 "has_weapon_properties": {"$ne": ["$weapon_category", 'null']},
                 "has_armor_class": {"$ne": ["$armor_class", 'null']}
             }},
             
             # Stage 3: Calcola le metriche
             {"$addFields": {
-                "market_tier": {
-                    "$switch": {
-                        "branches": [
-                            {"case": {"$lt": ["$cost_in_gp", 1]}, "then": "Budget"},
-                            {"case": {"$lt": ["$cost_in_gp", 10]}, "then": "Economy"},
-                            {"case": {"$lt": ["$cost_in_gp", 50]}, "then": "Standard"},
-                            {"case": {"$lt": ["$cost_in_gp", 200]}, "then": "Premium"},
-                            {"case": {"$lt": ["$cost_in_gp", 1000]}, "then": "Luxury"}
-                        ],
-                        "default": "Ultra-Luxury"
-                    }
-                },
                 "utility_score": {
                     "$add": [
                         {"$cond": [{"$eq": ["$has_weapon_properties", True]}, 6, 0]},
@@ -910,7 +1170,15 @@ class DNDDataAnalyzer:
                 }
             }},
             
-            # Stage 4: Raggruppa per categoria e tier
+            # Stage 4: Assegna il market tier dai limiti di costo in gp
+            self.tier_label_stage(
+                "$cost_in_gp",
+                [1, 10, 50, 200, 1000],
+                ["Budget", "Economy", "Standard", "Premium", "Luxury", "Ultra-Luxury"],
+                "market_tier"
+            ),
+            
+            # Stage 5: Raggruppa per categoria e tier
             {"$group": {
                 "_id": {
                     "category": "$category",
@@ -930,7 +1198,7 @@ class DNDDataAnalyzer:
                 }}
             }},
             
-            # Stage 5: Fa il reshape per categoria
+            # Stage 6: Fa il reshape per categoria
             {"$group": {
                 "_id": "$_id.category",
                 "total_items": {"$sum": "$item_count"},
@@ -953,7 +1221,7 @@ class DNDDataAnalyzer:
                 "category_avg_utility": {"$avg": "$avg_utility"}
             }},
             
-            # Stage 6: Aggiunge categoria della posizione di mercato
+            # Stage 7: Aggiunge categoria della posizione di mercato
             {"$addFields": {
                 "market_position": {
                     "$switch": {
@@ -967,11 +1235,34 @@ class DNDDataAnalyzer:
                 }
             }},
             
-            {"$sort": {"category_avg_cost": -1}}
+            # Stage 8: Panoramica ridotta ai campi mostrati + top 3 categorie con sort/limit lato server
+            {"$facet": {
+                "overview": [
+                    {"$sort": {"category_avg_cost": -1}},
+                    {"$project": {
+                        "total_items": 1,
+                        "category_avg_cost": 1,
+                        "category_avg_utility": 1,
+                        "market_position": 1
+                    }}
+                ],
+                "top": [
+                    {"$sort": {"category_avg_cost": -1}},
+                    {"$limit": 3},
+                    {"$project": {
+                        "market_position": 1,
+                        "total_items": 1,
+                        "category_avg_cost": 1,
+                        "tier_breakdown": 1
+                    }}
+                ]
+            }}
         ]
         
         try:
-            results = list(self.db.equipment.aggregate(pipeline))
+            facets = next(iter(self.run_aggregation("equipment", pipeline)), {})
+            results = facets.get("overview", [])
+            top_categories = facets.get("top", [])
             
             if results:
                 self.print_subsection("Equipment Category Market Overview")
@@ -994,7 +1285,7 @@ class DNDDataAnalyzer:
                 print("TOP 3 EQUIPMENT CATEGORIES - DETAILED MARKET ANALYSIS")
                 print("="*80)
                 
-                for i, category in enumerate(results[:3], 1):
+                for i, category in enumerate(top_categories, 1):
                     name = category.get("_id", "Unknown") or "Unknown"
                     position = category.get("market_position", "Unknown") or "Unknown"
                     total_items = category.get("total_items", 0)
@@ -1078,7 +1369,6 @@ class DNDDataAnalyzer:
                         
         except Exception as e:
             print(f"Error in equipment market analysis: {e}")
-            import traceback
             traceback.print_exc()
     
     def analyze_equipment_cost_distribution(self):
@@ -1092,41 +1382,24 @@ class DNDDataAnalyzer:
                 "cost.unit": {"$exists": True, "$ne": None}
             }},
             
-            # Stage 2: Normalizza i costi per le monete di rame
+            # Stage 2: Normalizza il peso (il costo in cp è già materializzato)
             {"$addFields": {
-                "cost_in_cp": {
-                    "$switch": {
-                        "branches": [
-                            {"case": {"$eq": ["$cost.unit", "cp"]}, "then": "$cost.quantity"},
-                            {"case": {"$eq": ["$cost.unit", "sp"]}, "then": {"$multiply": ["$cost.quantity", 10]}},
-                            {"case": {"$eq": ["$cost.unit", "gp"]}, "then": {"$multiply": ["$cost.quantity", 100]}},
-                            {"case": {"$eq": ["$cost.unit", "pp"]}, "then": {"$multiply": ["$cost.quantity", 1000]}}
-                        ],
-                        "default": 0
-                    }
-                },
-                "weight": {"$ifNull": ["$weight", 0]},
-                "category": "$equipment_category.name"
+                "weight": {"$ifNull": ["$weight", 0]}
             }},
             
-            # Stage 3: Aggiunge categorie dei costi
+            # Stage 3: Aggiunge categorie dei costi dai limiti di costo in cp
+            self.tier_label_stage(
+                "$_cost_in_cp",
+                [100, 1000, 5000, 10000, 50000],
+                ["Budget (< 1 gp)", "Affordable (1-9 gp)", "Moderate (10-49 gp)",
+                 "Expensive (50-99 gp)", "Luxury (100-499 gp)", "Premium (500+ gp)"],
+                "cost_tier"
+            ),
             {"$addFields": {
-                "cost_tier": {
-                    "$switch": {
-                        "branches": [
-                            {"case": {"$lt": ["$cost_in_cp", 100]}, "then": "Budget (< 1 gp)"},
-                            {"case": {"$lt": ["$cost_in_cp", 1000]}, "then": "Affordable (1-9 gp)"},
-                            {"case": {"$lt": ["$cost_in_cp", 5000]}, "then": "Moderate (10-49 gp)"},
-                            {"case": {"$lt": ["$cost_in_cp", 10000]}, "then": "Expensive (50-99 gp)"},
-                            {"case": {"$lt": ["$cost_in_cp", 50000]}, "then": "Luxury (100-499 gp)"}
-                        ],
-                        "default": "Premium (500+ gp)"
-                    }
-                },
                 "cost_per_weight": {
                     "$cond": [
                         {"$gt": ["$weight", 0]},
-                        {"$divide": ["$cost_in_cp", "$weight"]},
+                        {"$divide": ["$_cost_in_cp", "$weight"]},
                         "null"
                     ]
                 }
@@ -1134,19 +1407,19 @@ class DNDDataAnalyzer:
             
             # Stage 4: Raggruppa per categoria
             {"$group": {
-                "_id": "$category",
+                "_id": "$_category",
                 "total_items": {"$sum": 1},
-                "avg_cost_cp": {"$avg": "$cost_in_cp"},
-                "min_cost_cp": {"$min": "$cost_in_cp"},
-                "max_cost_cp": {"$max": "$cost_in_cp"},
-                "std_dev_cost": {"$stdDevPop": "$cost_in_cp"},
+                "avg_cost_cp": {"$avg": "$_cost_in_cp"},
+                "min_cost_cp": {"$min": "$_cost_in_cp"},
+                "max_cost_cp": {"$max": "$_cost_in_cp"},
+                "std_dev_cost": {"$stdDevPop": "$_cost_in_cp"},
                 "avg_weight": {"$avg": "$weight"},
                 "cost_tiers": {"$push": "$cost_tier"},
                 "items_with_weight": {"$sum": {"$cond": [{"$gt": ["$weight", 0]}, 1, 0]}},
                 "avg_cost_per_weight": {"$avg": "$cost_per_weight"},
                 "sample_items": {"$push": {
                     "name": "$name",
-                    "cost_cp": "$cost_in_cp",
+                    "cost_cp": "$_cost_in_cp",
                     "weight": "$weight",
                     "cost_tier": "$cost_tier"
                 }}
@@ -1164,11 +1437,25 @@ class DNDDataAnalyzer:
                 }
             }},
             
-            {"$sort": {"avg_cost_cp": -1}}
+            {"$sort": {"avg_cost_cp": -1}},
+            
+            # Stage 6: Restituisce solo i campi stampati
+            {"$project": {
+                "total_items": 1,
+                "avg_cost_gp": 1,
+                "cost_variance_coefficient": 1,
+                "min_cost_cp": 1,
+                "max_cost_cp": 1,
+                "items_with_weight": 1,
+                "avg_weight": 1,
+                "avg_cost_per_weight": 1,
+                "cost_tiers": 1,
+                "sample_items": 1
+            }}
         ]
         
         try:
-            results = list(self.db.equipment.aggregate(pipeline))
+            results = self.run_aggregation("equipment", pipeline)
             
             if results:
                 self.print_subsection("Equipment Cost Analysis by Category")
@@ -1193,7 +1480,7 @@ class DNDDataAnalyzer:
                     
                     # Analyze cost tier distribution
                     cost_tiers = Counter(category["cost_tiers"])
-                    most_common_tier = cost_tiers.most_common(1)[0] if cost_tiers else ("Unknown", 0)
+                    most_common_tier = max(cost_tiers.items(), key=operator.itemgetter(1)) if cost_tiers else ("Unknown", 0)
                     print(f"  Most Common Tier: {most_common_tier[0]} ({most_common_tier[1]}/{total})")
                     
                     # Show sample expensive and cheap items
@@ -1215,112 +1502,68 @@ class DNDDataAnalyzer:
     # RACE POTENTIAL ANALYSIS
     # ================
     
-    def analyze_racial_competitive_advantage(self):
+    def analyze_racial_competitive_advantage(self, top_n: int = 5):
         """Analizza i vantaggi competitivi delle razze"""
         self.print_section_header("RACIAL COMPETITIVE ADVANTAGE ANALYSIS")
         
+        # Pipeline A: dettaglio solo per le prime top_n razze (punteggi materializzati da materialize_race_scores)
         pipeline = [
-            # Stage 1: Estrae e normalizza le caratteristiche razziali
-            {"$addFields": {
-                "total_ability_bonuses": {
-                    "$sum": {
-                        "$map": {
-                            "input": {"$ifNull": ["$ability_bonuses", []]},
-                            "as": "bonus",
-                            "in": "$bonus.bonus"
-                        }
-                    }
-                },
-                "unique_ability_bonuses": {"$size": {"$ifNull": ["$ability_bonuses", []]}},
-                "base_speed": {"$ifNull": ["$speed", 30]},
-                "size_category": "$size",
-                "special_abilities_count": {"$size": {"$ifNull": ["$traits", []]}},
-                "languages_count": {"$size": {"$ifNull": ["$languages", []]}},
-                "proficiencies_count": {"$size": {"$ifNull": ["$proficiencies", []]}}
-            }},
-            
-            # Stage 2: Calcola le metriche di competizione 
-            {"$addFields": {
-                "stat_optimization_score": {
-                    "$add": [
-                        {"$multiply": ["$total_ability_bonuses", 2]},
-                        {"$multiply": ["$unique_ability_bonuses", 1.5]}
-                    ]
-                },
-                "versatility_score": {
-                    "$add": [
-                        {"$multiply": ["$special_abilities_count", 1.5]},
-                        {"$multiply": ["$languages_count", 0.5]},
-                        {"$multiply": ["$proficiencies_count", 1.0]}
-                    ]
-                },
-                "mobility_score": {
-                    "$multiply": [
-                        {"$divide": ["$base_speed", 30]},
-                        3
-                    ]
-                },
-                "size_advantage": {
-                    "$switch": {
-                        "branches": [
-                            {"case": {"$eq": ["$size_category", "Small"]}, "then": 2},
-                            {"case": {"$eq": ["$size_category", "Medium"]}, "then": 3},
-                            {"case": {"$eq": ["$size_category", "Large"]}, "then": 1}
-                        ],
-                        "default": 1
-                    }
-                }
-            }},
+            # Stage 1: Solo razze con bonus e indice competitivo materializzato, top_n sull'indice
+            {"$match": RACE_ANALYSIS_FILTER},
+            {"$sort": {"competitive_index": -1}},
+            {"$limit": top_n},
             
-            # Stage 3: Calcola gli indici totali di competizione
-            {"$addFields": {
-                "competitive_index": {
-                    "$add": [
-                        {"$multiply": ["$stat_optimization_score", 0.4]},
-                        {"$multiply": ["$versatility_score", 0.3]},
-                        {"$multiply": ["$mobility_score", 0.2]},
-                        {"$multiply": ["$size_advantage", 0.1]}
-                    ]
-                },
-                "specialization_type": {
-                    "$switch": {
-                        "branches": [
-                            {"case": {"$gte": ["$stat_optimization_score", 8]}, "then": "Stat Specialist"},
-                            {"case": {"$gte": ["$versatility_score", 6]}, "then": "Utility Specialist"},
-                            {"case": {"$gte": ["$mobility_score", 4]}, "then": "Mobility Specialist"},
-                            {"case": {"$gte": ["$special_abilities_count", 4]}, "then": "Feature Rich"}
-                        ],
-                        "default": "Balanced"
-                    }
-                }
-            }},
-            
-            # Stage 4: Determina il market tier
-            {"$addFields": {
-                "competitive_tier": {
-                    "$switch": {
-                        "branches": [
-                            {"case": {"$gte": ["$competitive_index", 12]}, "then": "S-Tier"},
-                            {"case": {"$gte": ["$competitive_index", 10]}, "then": "A-Tier"},
-                            {"case": {"$gte": ["$competitive_index", 8]}, "then": "B-Tier"},
-                            {"case": {"$gte": ["$competitive_index", 6]}, "then": "C-Tier"}
-                        ],
-                        "default": "D-Tier"
-                    }
+            # Stage 2: Restituisce solo i campi stampati
+            {"$project": {
+                "_id": 0,
+                "name": 1,
+                "competitive_index": 1,
+                "stat_optimization_score": 1,
+                "versatility_score": 1,
+                "base_speed": 1,
+                "specialization_type": 1,
+                "total_ability_bonuses": 1,
+                "special_abilities_count": 1,
+                "size_category": 1
+            }}
+        ]
+        
+        # Pipeline B: solo l'istogramma dei tier, senza le metriche di dettaglio
+        tier_pipeline = [
+            {"$match": RACE_ANALYSIS_FILTER},
+            {"$bucket": {
+                "groupBy": "$competitive_index",
+                "boundaries": RACE_TIER_BOUNDARIES,
+                "default": "D-Tier",
+                "output": {
+                    "races": {"$push": "$name"},
+                    "count": {"$sum": 1}
                 }
             }},
-            
-            {"$sort": {"competitive_index": -1}}
+            # Dal tier più alto al più basso (il limite inferiore è l'_id del bucket)
+            {"$sort": {"_id": -1}}
         ]
         
         try:
-            results = list(self.db.races.aggregate(pipeline))
+            # Spill su disco consentito, un solo batch di risposta; hint sull'indice parziale
+            # del competitive_index solo se esiste (altrimenti l'aggregate fallirebbe)
+            race_options = {"allowDiskUse": True, "batchSize": 1000}
+            if "competitive_index_ranked" in self.db.races.index_information():
+                race_options["hint"] = "competitive_index_ranked"
+            results = self.run_aggregation("races", pipeline, **race_options)
+            tier_rows = self.run_aggregation("races", tier_pipeline, **race_options)
+            
+            # Il tier è derivato in Python dagli stessi limiti del $bucket
+            for race in results:
+                race["competitive_tier"] = race_tier_label(race["competitive_index"])
             
             if results:
-                self.print_subsection("Racial Competitive Rankings")
+                self.print_subsection(f"Racial Competitive Rankings (Top {top_n})")
                 
-                print(f"{'Race':<20} {'Index':<6} {'Tier':<6} {'Stats':<6} {'Utility':<7} {'Speed':<6} {'Type':<17}")
-                print("-" * 80)
+                lines = [
+                    f"{'Race':<20} {'Index':<6} {'Tier':<6} {'Stats':<6} {'Utility':<7} {'Speed':<6} {'Type':<17}",
+                    "-" * 80
+                ]
                 
                 for race in results:
                     name = race["name"]
@@ -1331,41 +1574,34 @@ class DNDDataAnalyzer:
                     speed = race["base_speed"]
                     spec_type = race["specialization_type"]
                     
-                    print(f"{name:<20} {index:<6.1f} {tier:<6} {stats:<6.1f} {utility:<7.1f} {speed:<6} {spec_type:<17}")
+                    lines.append(f"{name:<20} {index:<6.1f} {tier:<6} {stats:<6.1f} {utility:<7.1f} {speed:<6} {spec_type:<17}")
                 
                 # Tier distribution
-                print("\n" + "="*50)
-                print("COMPETITIVE TIER DISTRIBUTION:")
-                print("="*50)
-                
-                tier_counts = {}
-                for race in results:
-                    tier = race["competitive_tier"]
-                    if tier not in tier_counts:
-                        tier_counts[tier] = []
-                    tier_counts[tier].append(race["name"])
+                lines.extend(["\n" + "="*50, "COMPETITIVE TIER DISTRIBUTION:", "="*50])
                 
-                tier_order = ["S-Tier", "A-Tier", "B-Tier", "C-Tier", "D-Tier"]
-                for tier in tier_order:
-                    if tier in tier_counts:
-                        races = tier_counts[tier]
-                        print(f"\n{tier}: {len(races)} races")
-                        print(f"  {', '.join(races)}")
+                for row in tier_rows:
+                    tier = row["_id"] if isinstance(row["_id"], str) else race_tier_label(row["_id"])
+                    lines.append(f"\n{tier}: {row['count']} races")
+                    lines.append(f"  {', '.join(row['races'])}")
                 
                 # Top performers analysis
-                print("\n" + "="*50)
-                print("TOP 5 COMPETITIVE ADVANTAGES:")
-                print("="*50)
+                lines.extend(["\n" + "="*50, "TOP 5 COMPETITIVE ADVANTAGES:", "="*50])
                 
-                for i, race in enumerate(results[:5], 1):
-                    name = race["name"]
-                    print(f"\n#{i} - {name} ({race['competitive_tier']}):")
-                    print(f"  Competitive Index: {race['competitive_index']:.2f}")
-                    print(f"  Specialization: {race['specialization_type']}")
-                    print(f"  Total Ability Bonuses: +{race['total_ability_bonuses']}")
-                    print(f"  Special Abilities: {race['special_abilities_count']}")
-                    print(f"  Base Speed: {race['base_speed']} ft")
-                    print(f"  Size: {race['size_category']}")
+                # Un blocco formattato per razza
+                lines.extend(
+                    f"""
+#{i} - {race['name']} ({race['competitive_tier']}):
+  Competitive Index: {race['competitive_index']:.2f}
+  Specialization: {race['specialization_type']}
+  Total Ability Bonuses: +{race['total_ability_bonuses']}
+  Special Abilities: {race['special_abilities_count']}
+  Base Speed: {race['base_speed']} ft
+  Size: {race['size_category']}"""
+                    for i, race in enumerate(results, 1)
+                )
+                
+                # Una sola scrittura su stdout per tutta la sezione
+                sys.stdout.write("\n".join(lines) + "\n")
                     
         except Exception as e:
             print(f"Error in racial advantage analysis: {e}")
@@ -1382,7 +1618,8 @@ def main():
     
     # Connessione al database
     try:
-        client = pymongo.MongoClient('mongodb://localhost:27017/')
+        client = pymongo.MongoClient('mongodb://localhost:27017/',
+                                     compressors='zstd,snappy,zlib', zlibCompressionLevel=6)
         client.admin.command('ping')
         db = client['HeroNomics']
         print(f"✓ Connected to MongoDB database: HeroNomics")
@@ -1390,8 +1627,14 @@ def main():
         print("✗ Error: Could not connect to MongoDB")
         sys.exit(1)
     
+    # Import opzionale dei dati riusando lo stesso client
+    if "--import" in sys.argv:
+        from mongodb_import import run_import
+        run_import(client)
+    
     # Inizializza analyzer
-    analyzer = DNDDataAnalyzer(db)
+    analyzer = DNDDataAnalyzer(db, cache_path=ANALYSIS_CACHE_PATH, materialize=True,
+                               refresh="--refresh" in sys.argv)
     
     # Menu interattivo per scegliere le analisi
     analyses = {
@@ -1417,20 +1660,20 @@ def main():
     choice = input("> ").strip().lower()
     
     if choice == 'all':
-        selected_analyses = [key for key in analyses.keys() if key != 'all']
+        selected_analyses = list(analyses.keys())
     else:
         selected_analyses = [c.strip() for c in choice.split(',')]
     
+    # Lista ordinata delle analisi da eseguire, senza duplicati (es. "1,1,1")
+    tasks = [analyses[key] for key in dict.fromkeys(selected_analyses) if key in analyses and key != 'all']
+    
     # Esegui analisi selezionate
-    for analysis_key in selected_analyses:
-        if analysis_key in analyses and analysis_key != 'all':
-            description, func = analyses[analysis_key]
-            if func:
-                try:
-                    print(f"\n{'='*20} EXECUTING: {description.upper()} {'='*20}")
-                    func()
-                except Exception as e:
-                    print(f"Error executing {description}: {e}")
+    for description, func in tasks:
+        try:
+            print(f"\n{'='*20} EXECUTING: {description.upper()} {'='*20}")
+            func()
+        except Exception as e:
+            print(f"Error executing {description}: {e}")
     
     # Chiusura connessione
     client.close()
@@ -1439,4 +1682,4 @@ def main():
     print("="*70)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
\ No newline at end of file
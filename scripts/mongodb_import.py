@@ -1,92 +1,203 @@
 import os
 import json
+import glob
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pymongo import MongoClient
+from pymongo.errors import BulkWriteError, OperationFailure
+from mongodb_analyzer import ANALYSIS_CACHE_PATH, materialize_equipment_fields, materialize_race_scores
 
-# Connessione a MongoDB
-client = MongoClient('mongodb://localhost:27017/')
-db = client['HeroNomics']
+# Cache su disco delle aggregazioni del visualizer (vedi DNDVisualizer._cached_aggregate)
+VISUALIZER_CACHE_DIR = os.path.join('site', 'dnd_images', '.cache')
+
+try:
+    import ijson
+    JSON_ERRORS = (json.JSONDecodeError, ijson.JSONError)
+except ImportError:
+    ijson = None  # Senza ijson i file vengono letti interi con json.load
+    JSON_ERRORS = (json.JSONDecodeError,)
+
+# Database di destinazione
+db_name = 'HeroNomics'
 
 # Cartella principale
 base_folder = 'dnd_data'
 
+# Documenti per ogni insert_many
+batch_size = 5_000
+
+# Sottocartelle importate in parallelo
+max_workers = 8
+
 # File di riferimento speciale
 reference_file = '_reference_mapping'
 reference_path = os.path.join(base_folder, reference_file)
 reference_json = reference_path + '.json'
 
-def import_json_files(folder_path, collection_name):
-    """Importa tutti i file JSON da una cartella in una collezione MongoDB"""
+def insert_batch(collection, batch, errors):
+    """Inserisce un blocco di documenti con un insert_many non ordinato e restituisce quanti ne sono entrati"""
+    try:
+        result = collection.insert_many(batch, ordered=False, bypass_document_validation=True)
+        return len(result.inserted_ids)
+    except BulkWriteError as e:
+        for error in e.details.get('writeErrors', []):
+            errors.append(f"Errore durante l'importazione in {collection.name} (documento {error.get('index')}): {error.get('errmsg')}")
+        return e.details.get('nInserted', 0)
+
+def iter_json_documents(f):
+    """Restituisce i documenti di un file JSON: gli array vengono letti in streaming con ijson"""
+    first_char = f.read(1)
+    while first_char.isspace():
+        first_char = f.read(1)
+    if not first_char:
+        return []
+    f.seek(0)
+    
+    if first_char == b'[' and ijson is not None:
+        return ijson.items(f, 'item', use_float=True)
+    
+    data = json.load(f)
+    return data if isinstance(data, list) else [data]
+
+def import_json_files(db, folder_path, collection_name):
+    """Importa tutti i file JSON da una cartella in una collezione MongoDB.
+    
+    Non stampa nulla (viene eseguita anche nei thread): restituisce il numero
+    di documenti importati e la lista dei messaggi di errore.
+    """
     collection = db[collection_name]
     file_count = 0
+    errors = []
+    buffer = []
     
     for filename in os.listdir(folder_path):
         if filename.endswith('.json'):
             file_path = os.path.join(folder_path, filename)
             try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    
-                    # Inserisci in base al tipo (array o oggetto singolo)
-                    if isinstance(data, list):
-                        if data:  # Verifica che la lista non sia vuota
-                            collection.insert_many(data)
-                            file_count += len(data)
-                    else:
-                        collection.insert_one(data)
-                        file_count += 1
-                        
-            except json.JSONDecodeError as e:
-                print(f"Errore JSON in {file_path}: {e}")
+                with open(file_path, 'rb') as f:
+                    # Il file entra nel buffer solo se è stato letto per intero:
+                    # un JSON troncato non lascia documenti parziali nella collezione
+                    file_docs = list(iter_json_documents(f))
+            except JSON_ERRORS as e:
+                errors.append(f"Errore JSON in {file_path}: {e}")
             except Exception as e:
-                print(f"Errore durante l'importazione di {file_path}: {e}")
+                errors.append(f"Errore durante l'importazione di {file_path}: {e}")
+            else:
+                # Riempie il buffer e lo svuota ogni batch_size documenti
+                buffer.extend(file_docs)
+                while len(buffer) >= batch_size:
+                    file_count += insert_batch(collection, buffer[:batch_size], errors)
+                    buffer = buffer[batch_size:]
     
-    return file_count
-
-# Gestione del file reference_mapping (se esiste)
-if os.path.exists(reference_json) and os.path.isfile(reference_json):
-    # Se è un singolo file JSON
-    print(f"Importazione file {reference_file}.json...")
-    count = import_json_files(base_folder, reference_file)  # passa solo il nome base
-    print(f"Importati {count} documenti in reference_mapping")
+    if buffer:
+        file_count += insert_batch(collection, buffer, errors)
+    
+    return file_count, errors
 
-elif os.path.isdir(reference_path):
-    # Se è una cartella
-    print(f"Importazione cartella {reference_file}...")
-    count = import_json_files(reference_path, '_reference_mapping')
-    print(f"Importati {count} documenti in reference_mapping")
+def print_errors(errors):
+    """Stampa i messaggi di errore raccolti durante un'importazione"""
+    for error in errors:
+        print(error)
 
-else:
-    print(f"❌ File o cartella non trovati: {reference_json} o {reference_path}")
+# Indici usati da $match/$sort/$lookup delle pipeline di mongodb_analyzer.py
+analysis_indexes = {
+    'spells': [
+        [('classes.name', 1), ('level', 1)],    # $lookup classi -> spell
+        [('school.name', 1), ('level', 1)],     # $match sulla scuola di magia
+    ],
+    'equipment': [
+        [('cost.quantity', 1), ('cost.unit', 1)],  # $match sugli item con costo
+    ],
+}
 
-# Loop sulle sottocartelle
-print("\nImportazione sottocartelle...")
-for subfolder in os.listdir(base_folder):
-    subfolder_path = os.path.join(base_folder, subfolder)
-    
-    # Salta il file/cartella reference_mapping già gestito
-    if subfolder == reference_file:
-        continue
-    
-    # Processa solo le cartelle
-    if os.path.isdir(subfolder_path):
-        print(f"Elaborazione cartella: {subfolder}")
-        
-        # Usa il nome della cartella come nome della collezione
-        collection_name = subfolder.lower().replace(' ', '_').replace('-', '_')
-        
-        # Importa tutti i JSON della sottocartella
-        count = import_json_files(subfolder_path, collection_name)
+def run_import(client):
+    """Importa la cartella dnd_data nel database usando il client MongoDB passato"""
+    db = client[db_name]
+    
+    # Gestione del file reference_mapping (se esiste)
+    if os.path.exists(reference_json) and os.path.isfile(reference_json):
+        # Se è un singolo file JSON
+        print(f"Importazione file {reference_file}.json...")
+        count, errors = import_json_files(db, base_folder, reference_file)  # passa solo il nome base
+        print_errors(errors)
+        print(f"Importati {count} documenti in reference_mapping")
+    
+    elif os.path.isdir(reference_path):
+        # Se è una cartella
+        print(f"Importazione cartella {reference_file}...")
+        count, errors = import_json_files(db, reference_path, '_reference_mapping')
+        print_errors(errors)
+        print(f"Importati {count} documenti in reference_mapping")
+    
+    else:
+        print(f"❌ File o cartella non trovati: {reference_json} o {reference_path}")
+    
+    # Sottocartelle importate in parallelo (PyMongo è thread-safe e usa un pool di connessioni)
+    print("\nImportazione sottocartelle...")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        for subfolder in os.listdir(base_folder):
+            subfolder_path = os.path.join(base_folder, subfolder)
+            
+            # Salta il file/cartella reference_mapping già gestito
+            if subfolder == reference_file:
+                continue
+            
+            # Processa solo le cartelle
+            if os.path.isdir(subfolder_path):
+                # Usa il nome della cartella come nome della collezione
+                collection_name = subfolder.lower().replace(' ', '_').replace('-', '_')
+                
+                # Importa tutti i JSON della sottocartella
+                future = executor.submit(import_json_files, db, subfolder_path, collection_name)
+                futures[future] = (subfolder, collection_name)
         
-        if count > 0:
-            print(f"  -> Importati {count} documenti nella collezione '{collection_name}'")
-        else:
-            print(f"  -> Nessun file JSON trovato in {subfolder}")
-
-print("\nImportazione completata!")
+        for future in as_completed(futures):
+            subfolder, collection_name = futures[future]
+            count, errors = future.result()
+            
+            print(f"Elaborazione cartella: {subfolder}")
+            print_errors(errors)
+            if count > 0:
+                print(f"  -> Importati {count} documenti nella collezione '{collection_name}'")
+            else:
+                print(f"  -> Nessun file JSON trovato in {subfolder}")
+    
+    print("\nImportazione completata!")
+    
+    # I dati sono cambiati: invalida la cache delle analisi (shelve può creare più file)
+    for cache_file in glob.glob(ANALYSIS_CACHE_PATH + '*'):
+        os.remove(cache_file)
+    for cache_file in glob.glob(os.path.join(VISUALIZER_CACHE_DIR, '*.pkl')):
+        os.remove(cache_file)
+    
+    # Materializza costo normalizzato e categoria dell'equipaggiamento per le analisi
+    if 'equipment' in db.list_collection_names():
+        updated = materialize_equipment_fields(db)
+        print(f"Campi di costo materializzati su {updated} documenti di equipaggiamento")
+    
+    # Materializza i punteggi competitivi delle razze con $merge (e l'indice per il sort)
+    if 'races' in db.list_collection_names():
+        updated = materialize_race_scores(db)
+        print(f"Punteggi competitivi materializzati su {updated} razze")
+    
+    print("\nCreazione indici per le analisi...")
+    for collection_name, indexes in analysis_indexes.items():
+        for keys in indexes:
+            try:
+                db[collection_name].create_index(keys)
+            except OperationFailure as e:
+                print(f"  -> Indice {keys} su {collection_name} non creato: {e}")
+    
+    # Mostra un riepilogo delle collezioni create
+    print("\nCollezioni create:")
+    collection_names = db.list_collection_names()
+    for name in sorted(collection_names):
+        count = db[name].estimated_document_count()
+        print(f"  - {name}: {count} documenti")
 
-# Mostra un riepilogo delle collezioni create
-print("\nCollezioni create:")
-collection_names = db.list_collection_names()
-for name in sorted(collection_names):
-    count = db[name].count_documents({})
-    print(f"  - {name}: {count} documenti")
+if __name__ == "__main__":
+    # Compressione del wire protocol: PyMongo ignora i compressori non installati (zstandard, python-snappy)
+    client = MongoClient('mongodb://localhost:27017/', maxPoolSize=32,
+                         compressors='zstd,snappy,zlib', zlibCompressionLevel=6)
+    run_import(client)
+    client.close()
@@ -28,9 +28,10 @@ class GraphMetrics:
 
 class DNDGraphAnalyzer:
     
-    def __init__(self, uri: str = "bolt://localhost:7687", user: str = "neo4j", password: str = "admin123", database: str = "heronomics"):
+    def __init__(self, uri: str = "bolt://localhost:7687", user: str = "neo4j", password: str = "admin123", database: str = "heronomics", driver=None):
         try:
-            self.driver = GraphDatabase.driver(uri, auth=(user, password), database=database)
+            # Riusa il driver (e il suo pool) del chiamante se fornito
+            self.driver = driver or GraphDatabase.driver(uri, auth=(user, password), database=database)
             self.verify_connection()
             print(f"✓ Connected to Neo4j at {uri}")
         except Exception as e: